@@ -1,23 +1,33 @@
-import inspect
+import math
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
-import plotly.offline as pyo
 import joblib
-import tensorflow as tf
-from tensorflow.keras import layers, models, regularizers
-from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
-from flask import Flask, render_template, request
-from scripts.map_visualisation import create_map_div
+from flask import Flask, Response, render_template, request, jsonify
+from scripts.map_visualisation import MapStore, MAP_ZOOM, create_map_div, viewport_geojson
 from scripts.visualisation import (
    forecast_accidents_sma,
    analyze_deaths_by_gender_age_type,
    analyze_deaths_by_weekday,
    plotly_death_forecast,
-   accidents_by_month
+   accidents_by_month,
+   ChartAggregates
 )
 
-from scripts.model import prepare_sequence
+from scripts.processed_store import read_events, read_participants, store_version, STORE_DIR
+from scripts.daily_counts import DailyCounts
+from scripts.count_cube import CountCube, parse_by, parse_where
+from scripts.batching import MicroBatcher
+from scripts.inference import LSTMForecaster
+from scripts.resources import Resources
+from scripts.shared_arrays import load_shared
+from scripts.prediction_cache import PredictionCache
+from scripts.figure_cache import FigureCache
+from scripts.http_cache import conditional, compress, etag_for
+from scripts.manifest import file_hash
 from scripts.openai import describe_project, describe_chart
 from dotenv import load_dotenv
 
@@ -26,8 +36,36 @@ BASEDIR = os.path.abspath(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASEDIR, 'data', 'processed')
 MODELS_DIR = os.path.join(BASEDIR, 'models')
 MODEL_PATH = os.path.join(MODELS_DIR, 'lstm_accident_model_final.keras')
-EVENTS_CSV = os.path.join(DATA_DIR, 'cleaned_events.csv')
-PARTICIPANTS_CSV = os.path.join(DATA_DIR, 'cleaned_participants.csv')
+# NumPy weights exported from MODEL_PATH (python -m scripts.inference export)
+WEIGHTS_PATH = os.path.join(MODELS_DIR, 'lstm_accident_model_final.npz')
+COUNT_CUBE_PATH = os.path.join(DATA_DIR, 'count_cube.npz')
+DAILY_COUNTS_PATH = os.path.join(DATA_DIR, 'daily_counts.npz')
+# Derived arrays memory-mapped by every worker process (see scripts/shared_arrays.py);
+# SHARED_DATA=0 keeps a private copy in each process
+SHARED_DIR = os.getenv('SHARED_DIR', os.path.join(DATA_DIR, 'shared'))
+SHARED_DATA = os.getenv('SHARED_DATA', '1') != '0'
+SEQ_LEN = 30
+# /api/predict: requests arriving within PREDICT_BATCH_WAIT seconds share one forward pass
+PREDICT_BATCH_WAIT = float(os.getenv('PREDICT_BATCH_WAIT', 0.005))
+API_MAX_ITEMS = 1000
+API_TIMEOUT = 30
+# Forecast cache: PREDICTION_CACHE_SIZE entries in memory plus an optional SQLite file
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 4096))
+PREDICTION_CACHE_DB = os.getenv('PREDICTION_CACHE_DB') or None
+# Seconds between checks whether the model or daily counts files changed
+VERSION_CHECK_INTERVAL = 5
+DAY_NS = 86_400 * 10**9
+# AI chart descriptions are requested concurrently and waited for at most
+# DESCRIPTION_TIMEOUT seconds. DESCRIPTIONS_MODE 'inline' waits for them in the
+# page request; 'progressive' (or ?progressive=1) renders the charts at once
+# and the page fetches each description from /api/descriptions/<chart id>
+DESCRIPTION_TIMEOUT = float(os.getenv('DESCRIPTION_TIMEOUT', 15))
+DESCRIPTION_WORKERS = int(os.getenv('DESCRIPTION_WORKERS', 8))
+DESCRIPTIONS_MODE = os.getenv('DESCRIPTIONS_MODE', 'inline')
+DESCRIPTION_FALLBACK = 'Aprašymas šiuo metu nepasiekiamas.'
+# Only the columns the pages actually use are read from the store
+EVENT_COLUMNS = ['registrokodas', 'dataLaikas', 'savivaldybe', 'rusis', 'metai']
+PARTICIPANT_COLUMNS = ['registrokodas', 'lytis', 'amzius', 'bukle']
 load_dotenv()
 app = Flask(__name__, template_folder='templates', static_folder='static')
 app.secret_key = os.getenv('FLASK_SECRET_KEY')
@@ -37,15 +75,269 @@ if not os.getenv("OPENAI_API_KEY"):
 else:
     app.logger.info("OpenAI API key loaded successfully.")
 
-# load model
-model = tf.keras.models.load_model(MODEL_PATH)
-# load LabelEncoder
-le = joblib.load(os.path.join(MODELS_DIR, 'label_encoder.joblib'))
+# Startup mode: 'background' loads the resources below on a warm-up thread
+# while requests are already served, 'lazy' loads each on first use, 'eager'
+# loads everything before the app is returned, 'preload' (set by gunicorn.conf.py)
+# loads the fork-safe PRELOAD resources in the pre-fork master and the rest in
+# each worker after fork (after_fork())
+APP_STARTUP = os.getenv('APP_STARTUP', 'background')
+# Warm-up order: the predict path first, the large frames last
+WARM_UP_ORDER = ['daily_counts', 'mun_codes', 'model', 'versions', 'latest_forecasts',
+                 'map_store', 'count_cube', 'chart_aggregates', 'figures']
+# Plain NumPy/pandas resources (mostly memory-mapped, so shared with the forked
+# workers), plus the model if it is the NumPy engine; TensorFlow, threads and
+# SQLite connections are only created in the workers
+PRELOAD = ['daily_counts', 'mun_codes', 'map_store', 'count_cube', 'chart_aggregates']
+# Resources rebuilt when the model or the data change on disk
+RELOADABLE = ['model', 'daily_counts', 'versions', 'chart_aggregates', 'map_store', 'count_cube', 'figures']
 
-# load events data
-events_df = pd.read_csv(EVENTS_CSV, parse_dates=['dataLaikas'], low_memory=False)
-events_df['date'] = events_df['dataLaikas'].dt.floor('d')
-participants_df = pd.read_csv(PARTICIPANTS_CSV, low_memory=False)
+# /map display modes: points only for narrow filters, always points, grid cell counts
+MAP_MODES = {'auto': 'Automatinis', 'points': 'Taškai', 'grid': 'Tinklelis'}
+
+# /visualisations charts: (id, label, function of ChartAggregates)
+CHART_OPTIONS = [
+    ('by_month', 'Events by month', accidents_by_month),
+    ('sma', 'Yearly SMA forecast', forecast_accidents_sma),
+    ('death', 'Death trend', plotly_death_forecast),
+    ('gender', 'Death distribution by gender', analyze_deaths_by_gender_age_type),
+    ('weekday', 'Death by weekday', analyze_deaths_by_weekday),
+]
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_DB)
+figure_cache = FigureCache()
+
+def model_file():
+    # the NumPy engine if the weights are exported, Keras otherwise
+    return WEIGHTS_PATH if os.path.exists(WEIGHTS_PATH) else MODEL_PATH
+
+def load_model():
+    if model_file() == WEIGHTS_PATH:
+        return LSTMForecaster.load(WEIGHTS_PATH)
+    import tensorflow as tf
+    return tf.keras.models.load_model(MODEL_PATH)
+
+def load_mun_codes():
+    # model codes of the LabelEncoder classes
+    le = joblib.load(os.path.join(MODELS_DIR, 'label_encoder.joblib'))
+    return {m: i for i, m in enumerate(le.classes_)}
+
+def load_events():
+    events_df = read_events(columns=EVENT_COLUMNS)
+    events_df['date'] = events_df['dataLaikas'].dt.floor('d')
+    return events_df
+
+def data_version(path=None):
+    # version of a shared set: the file it is derived from, else the store
+    if path and os.path.exists(path):
+        stat = os.stat(path)
+        return f'{stat.st_mtime_ns}-{stat.st_size}'
+    return store_version(STORE_DIR)
+
+def shared(name, cls, build, path=None):
+    if not SHARED_DATA:
+        return build()
+    return load_shared(name, cls, build, data_version(path), SHARED_DIR)
+
+def load_daily_counts():
+    # municipality x day count matrix (written at ingest), so /predict only slices arrays
+    def build():
+        if os.path.exists(DAILY_COUNTS_PATH):
+            return DailyCounts.load(DAILY_COUNTS_PATH)
+        return DailyCounts.from_events(load_events())
+    return shared('daily_counts', DailyCounts, build, DAILY_COUNTS_PATH)
+
+def file_signatures():
+    signatures = []
+    for path in (model_file(), DAILY_COUNTS_PATH):
+        stat = os.stat(path) if os.path.exists(path) else None
+        signatures.append(stat and (stat.st_mtime_ns, stat.st_size))
+    return tuple(signatures)
+
+def load_versions():
+    # model file hash and data versions that cached forecasts and figures are keyed by
+    signatures = file_signatures()
+    versions = {
+        'model': file_hash(model_file())[:16],
+        'data': resources.get('daily_counts').fingerprint(),
+        'store': store_version(STORE_DIR),
+        'signatures': signatures,
+        'checked': time.monotonic(),
+    }
+    prediction_cache.purge(versions['model'], versions['data'])
+    figure_cache.purge(versions['store'])
+    return versions
+
+def load_latest_forecasts():
+    # the dashboard query: every municipality for the day after the data ends
+    daily_counts = resources.get('daily_counts')
+    mun_codes = resources.get('mun_codes')
+    date = daily_counts.end + pd.Timedelta(days=1)
+    return len(forecast([(m, date) for m in daily_counts.municipalities if m in mun_codes]))
+
+def current_versions():
+    """
+    Versions of the loaded model and data. At most every VERSION_CHECK_INTERVAL
+    seconds the model file and the daily counts file (rewritten by every
+    ingest) are checked; if one changed, the model and the data are reloaded,
+    so stale forecasts and figures are no longer hit.
+    """
+    versions = resources.get('versions')
+    now = time.monotonic()
+    if now - versions['checked'] >= VERSION_CHECK_INTERVAL:
+        versions['checked'] = now
+        if file_signatures() != versions['signatures']:
+            app.logger.info("Model or daily counts changed on disk, reloading")
+            loaded = [name for name in WARM_UP_ORDER if name in RELOADABLE and resources.loaded(name)]
+            resources.reset(*RELOADABLE)
+            versions = resources.get('versions')
+            # what was loaded before is loaded again in the background, so /ready recovers
+            resources.warm_up(loaded)
+    return versions
+
+def load_count_cube():
+    # written at ingest; built from the store if missing
+    def build():
+        if os.path.exists(COUNT_CUBE_PATH):
+            return CountCube.load(COUNT_CUBE_PATH)
+        return CountCube.from_store(STORE_DIR)
+    return shared('count_cube', CountCube, build, COUNT_CUBE_PATH)
+
+def load_map_store():
+    return shared('map_store', MapStore, lambda: MapStore.from_store(STORE_DIR))
+
+def load_chart_aggregates():
+    # every chart's counts in one pass; the frames themselves are not kept
+    build = lambda: ChartAggregates.from_frames(load_events(), read_participants(columns=PARTICIPANT_COLUMNS))
+    return shared('chart_aggregates', ChartAggregates, build)
+
+def build_chart(func):
+    return func(resources.get('chart_aggregates'))
+
+def query_etag(*versions):
+    # ETag of a GET JSON response: the data versions it is computed from and its parameters
+    return etag_for(request.path, sorted(request.args.items(multi=True)), *versions)
+
+def cached_charts(selected):
+    """
+    (id, label, figure, div) of the selected charts from the figure cache;
+    only the first div includes the plotly.js script tag.
+    """
+    version = current_versions()['store']
+    charts = []
+    for key, label, func in CHART_OPTIONS:
+        if key not in selected:
+            continue
+        build = lambda func=func: build_chart(func)
+        fig = figure_cache.figure(key, version, build)
+        div = figure_cache.div(key, version, build, include_plotlyjs=not charts)
+        charts.append((key, label, fig, div))
+    return charts
+
+description_pool = ThreadPoolExecutor(DESCRIPTION_WORKERS, thread_name_prefix='describe')
+# describe_chart futures by (chart id, data version), shared by concurrent requests
+descriptions = {}
+descriptions_lock = threading.Lock()
+
+def description_future(key, label, fig, version):
+    with descriptions_lock:
+        for stale in [k for k in descriptions if k[1] != version]:
+            del descriptions[stale]
+        future = descriptions.get((key, version))
+        # failed calls are retried by the next request
+        if future is None or (future.done() and future.exception() is not None):
+            future = description_pool.submit(describe_chart, fig, label, DESCRIPTION_TIMEOUT)
+            descriptions[(key, version)] = future
+    return future
+
+def description_result(future, deadline):
+    # a call still running past the deadline finishes in the background and
+    # lands in the LLM cache for the next page load
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0))
+    except Exception as e:
+        app.logger.warning(f"Chart description unavailable: {e!r}")
+        return DESCRIPTION_FALLBACK
+
+@app.after_request
+def compress_response(response):
+    return compress(request, response)
+
+resources = Resources()
+resources.register('model', load_model)
+resources.register('mun_codes', load_mun_codes)
+resources.register('chart_aggregates', load_chart_aggregates)
+resources.register('count_cube', load_count_cube)
+resources.register('daily_counts', load_daily_counts)
+resources.register('map_store', load_map_store)
+resources.register('versions', load_versions)
+resources.register('latest_forecasts', load_latest_forecasts)
+resources.register('figures', lambda: len(cached_charts([key for key, _, _ in CHART_OPTIONS])))
+
+def after_fork():
+    """Called in each worker of a pre-fork server (gunicorn.conf.py: post_fork)."""
+    resources.warm_up(WARM_UP_ORDER)
+
+def run_model(seqs, muns):
+    model = resources.get('model')
+    if isinstance(model, LSTMForecaster):
+        return model.predict(seqs, muns)
+    # a direct call avoids model.predict's per-call setup for small batches
+    return model([seqs.astype(np.float32), muns.astype(np.int32)], training=False).numpy()
+
+batcher = MicroBatcher(run_model, max_wait=PREDICT_BATCH_WAIT)
+
+def forecast(pairs):
+    """
+    Forecasts for (municipality, date) pairs. Each input window is the
+    SEQ_LEN days before the date, ending no later than the last day of data
+    (the anchor). Cached forecasts are returned directly; the rest go through
+    one batched model call. Returns [(anchor date, prediction)].
+    """
+    versions = current_versions()
+    daily_counts = resources.get('daily_counts')
+    start = daily_counts.start.to_datetime64().astype('datetime64[D]')
+    start_ns = daily_counts.start.value
+    ends, keys, values, misses = [], [], [], []
+    for municipality, date in pairs:
+        # integer day arithmetic keeps cached lookups in the microsecond range
+        end_day = min((date.value - start_ns) // DAY_NS - 1, daily_counts.n_days - 1)
+        if end_day < 0:
+            raise ValueError(f'date must be after {daily_counts.start.date()}')
+        key = (municipality, str(start + end_day), versions['model'], versions['data'])
+        value = prediction_cache.get(key)
+        if value is None:
+            misses.append(len(values))
+        ends.append(end_day)
+        keys.append(key)
+        values.append(value)
+
+    if misses:
+        mun_codes = resources.get('mun_codes')
+        seqs = np.concatenate([daily_counts.window(pairs[i][0], SEQ_LEN, ends[i]) for i in misses])
+        muns = np.array([mun_codes[pairs[i][0]] for i in misses], dtype=np.int32)
+        preds = batcher.predict(seqs, muns, timeout=API_TIMEOUT).ravel()
+        for i, pred in zip(misses, preds):
+            values[i] = float(pred)
+        prediction_cache.put_many({keys[i]: values[i] for i in misses})
+
+    return [(key[1], value) for key, value in zip(keys, values)]
+
+def parse_prediction_item(item):
+    if isinstance(item, dict):
+        municipality, date = item.get('savivaldybe'), item.get('date')
+    elif isinstance(item, (list, tuple)) and len(item) == 2:
+        municipality, date = item
+    else:
+        raise ValueError('expected {"savivaldybe": ..., "date": ...} or [savivaldybe, date]')
+    daily_counts = resources.get('daily_counts')
+    if municipality not in resources.get('mun_codes') or municipality not in daily_counts.index:
+        raise ValueError(f'unknown savivaldybe: {municipality!r}')
+    date = pd.Timestamp(date)
+    if pd.isna(date):
+        raise ValueError('missing date')
+    if date.normalize() <= daily_counts.start:
+        raise ValueError(f'date must be after {daily_counts.start.date()}')
+    return municipality, date.normalize()
 @app.route('/')
 def home():
 
@@ -60,119 +352,241 @@ def home():
 
 @app.route('/visualisations', methods=['GET', 'POST'])
 def visualisations():
-    options = [
-        ('by_month', 'Events by month', accidents_by_month),
-        ('sma', 'Yearly SMA forecast', forecast_accidents_sma),
-        ('death', 'Death trend', plotly_death_forecast),
-        ('gender', 'Death distribution by gender', analyze_deaths_by_gender_age_type),
-        ('weekday', 'Death by weekday', analyze_deaths_by_weekday),
-    ]
-
+    options = CHART_OPTIONS
+    progressive = DESCRIPTIONS_MODE == 'progressive' or request.args.get('progressive') == '1'
 
     selected = (request.form.getlist('graphs')
                 if request.method == 'POST'
                 else [key for key, _, _ in options])
 
-    graphs = []
-    first = True
-    for key, label, func in options:
-        if key not in selected:
-            continue
+    # Figures and their divs are built once per data version
+    charts = cached_charts(selected)
 
-        num_params = len(inspect.signature(func).parameters)
-        if num_params == 1:
-            fig = func(events_df)
-        elif num_params == 2:
-            fig = func(events_df, participants_df)
-        else:
-            raise RuntimeError(f'{func.__name__} has unexpected number of parameters.')
-
-        # Render the Plotly figure
-        div = pyo.plot(fig,
-                       include_plotlyjs='cdn' if first else False,
-                       output_type='div')
+    # All AI descriptions are requested at once (also in progressive mode, so
+    # they are already running when the page asks for them)
+    version = current_versions()['store']
+    futures = [description_future(key, label, fig, version) for key, label, fig, _ in charts]
+    deadline = time.monotonic() + DESCRIPTION_TIMEOUT
 
-        # Calls the AI describer
-        desc = describe_chart(fig, title=label)
+    graphs = []
+    for (key, label, fig, div), future in zip(charts, futures):
+        if progressive:
+            desc = future.result() if future.done() and future.exception() is None else None
+        else:
+            desc = description_result(future, deadline)
 
         graphs.append({
+            'key': key,
             'div': div,
             'desc': desc,
             'label': label
         })
-        first = False
 
     return render_template(
         'visualisations.html',
         options=options,
         selected=selected,
         graphs=graphs,
+        progressive=progressive,
+        fallback=DESCRIPTION_FALLBACK,
         title='Vizualizacijos'
     )
 
+@app.route('/api/charts/<chart_id>')
+def chart_json(chart_id):
+    """Plotly figure JSON of one /visualisations chart (Plotly.newPlot(div, data, layout))."""
+    charts = {key: func for key, _, func in CHART_OPTIONS}
+    if chart_id not in charts:
+        return jsonify(error=f'unknown chart: {chart_id}', charts=list(charts)), 404
+    version = current_versions()['store']
+    build = lambda: Response(figure_cache.json(chart_id, version, lambda: build_chart(charts[chart_id])),
+                             mimetype='application/json')
+    return conditional(request, query_etag(version), build)
+
+@app.route('/api/descriptions/<chart_id>')
+def chart_description(chart_id):
+    """AI description of one chart, for progressive /visualisations pages."""
+    charts = {key: (label, func) for key, label, func in CHART_OPTIONS}
+    if chart_id not in charts:
+        return jsonify(error=f'unknown chart: {chart_id}'), 404
+    label, func = charts[chart_id]
+    version = current_versions()['store']
+    fig = figure_cache.figure(chart_id, version, lambda: build_chart(func))
+    future = description_future(chart_id, label, fig, version)
+    description = description_result(future, time.monotonic() + DESCRIPTION_TIMEOUT)
+    return jsonify(chart=chart_id, description=description,
+                   fallback=description == DESCRIPTION_FALLBACK)
+
 @app.route('/predict', methods=['GET', 'POST'])
 def predict():
-    savivaldybes = sorted(events_df['savivaldybe'].unique())
     selected_municipality = ''
     selected_date = ''
     prediction = None
+    window_end = None
+    error = None
+    daily_counts = resources.get('daily_counts')
 
-    if request.method == 'POST' and model is not None:
+    if request.method == 'POST':
         selected_municipality = request.form['savivaldybe']
         selected_date       = request.form['date']
 
-        # 1. Filter to that municipality
-        df_sel = events_df[events_df['savivaldybe'] == selected_municipality].copy()
-
-        # 2. Prepare the (1,30,1) sequence for the model
-        seq = prepare_sequence(df_sel, seq_len=30)
-
-        # 3. Lookup its code and build the second input
-        mun_code = le.transform([selected_municipality])[0]
-        mun_arr  = np.array([mun_code], dtype=np.int32)
-
-        # 4. Predict with both inputs
-        pred = model.predict([seq, mun_arr], verbose=0)
-        prediction = int(pred.flatten()[0])
-
+        # Forecast for the selected date from the 30 days before it (cached)
+        try:
+            pair = parse_prediction_item([selected_municipality, selected_date])
+            [(window_end, value)] = forecast([pair])
+            prediction = int(value)
+        except ValueError as e:
+            error = str(e)
 
     return render_template(
         'predict.html',
         title='Prognozė',
-        savivaldybes=savivaldybes,
+        savivaldybes=daily_counts.municipalities,
         selected_municipality=selected_municipality,
         selected_date=selected_date,
-        prediction=prediction
+        prediction=prediction,
+        window_end=window_end,
+        error=error
     )
+@app.route('/api/predict', methods=['GET', 'POST'])
+def api_predict():
+    """
+    Forecasts for a list of (savivaldybe, date) pairs, e.g.
+    {"items": [{"savivaldybe": "Vilniaus m. sav.", "date": "2024-01-15"}, ...]},
+    or as a GET: /api/predict?savivaldybe=Vilniaus m. sav.&date=2024-01-15
+    (parameters repeated for more pairs), which carries an ETag of the model
+    and data versions. Cached pairs are answered directly; the rest, together
+    with concurrent requests, go through one model call.
+    """
+    if request.method == 'GET':
+        municipalities, dates = request.args.getlist('savivaldybe'), request.args.getlist('date')
+        if len(municipalities) != len(dates):
+            return jsonify(error='every savivaldybe needs a date'), 400
+        items = [list(pair) for pair in zip(municipalities, dates)]
+    else:
+        payload = request.get_json(silent=True)
+        items = payload.get('items') if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        return jsonify(error='expected a non-empty list of (savivaldybe, date) pairs'), 400
+    if len(items) > API_MAX_ITEMS:
+        return jsonify(error=f'at most {API_MAX_ITEMS} pairs per request'), 400
+
+    pairs = []
+    for i, item in enumerate(items):
+        try:
+            pairs.append(parse_prediction_item(item))
+        except (ValueError, TypeError) as e:
+            return jsonify(error=f'item {i}: {e}'), 400
+
+    build = lambda: jsonify(predictions=[
+        {
+            'savivaldybe': municipality,
+            'date': date.date().isoformat(),
+            'window_end': window_end,
+            'prediction': round(value, 3),
+        }
+        for (municipality, date), (window_end, value) in zip(pairs, forecast(pairs))
+    ])
+    if request.method == 'POST':
+        return build()
+    versions = current_versions()
+    return conditional(request, query_etag(versions['model'], versions['data']), build)
+
+@app.route('/api/map')
+def api_map():
+    """
+    GeoJSON of the events in a viewport, e.g.
+    /api/map?bbox=25.1,54.6,25.4,54.8&zoom=12&rusis=Kita&metai=2023.
+    bbox is min_lon,min_lat,max_lon,max_lat (default: everything); up to
+    zoom 11 the features are grid cells with counts, beyond it events.
+    """
+    map_store = resources.get('map_store')
+    try:
+        bbox = request.args.get('bbox')
+        bbox = [float(v) for v in bbox.split(',')] if bbox else [-180.0, -90.0, 180.0, 90.0]
+        if len(bbox) != 4 or not all(map(math.isfinite, bbox)):
+            raise ValueError('bbox must be four numbers min_lon,min_lat,max_lon,max_lat')
+        if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            raise ValueError('bbox minimum is greater than its maximum')
+        zoom = float(request.args.get('zoom', MAP_ZOOM))
+        if not math.isfinite(zoom):
+            raise ValueError('zoom must be a finite number')
+        year = request.args.get('metai')
+        year = int(year) if year else None
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    category = request.args.get('rusis') or None
+    return conditional(request, query_etag(current_versions()['store']),
+                       lambda: jsonify(viewport_geojson(map_store, bbox, zoom, category, year)))
+
+@app.route('/api/counts')
+def api_counts():
+    """
+    Counts from the count cube, e.g.
+    /api/counts?by=metai,lytis&where=rusis=Susidūrimas;metai=2022,2023.
+    measure is events or participants (default: participants if any
+    dimension is a participant one).
+    """
+    count_cube = resources.get('count_cube')
+    # validated before the ETag is compared, so an invalid query is never a 304
+    try:
+        by, where = parse_by(request.args.get('by')), parse_where(request.args.getlist('where'))
+        measure = count_cube.check(by, where, request.args.get('measure') or None)
+    except ValueError as e:
+        return jsonify(error=str(e), dimensions=count_cube.dims), 400
+
+    def build():
+        result = count_cube.query(by, where, measure)
+        return jsonify(by=list(result.columns[:-1]), total=int(result['count'].sum()),
+                       rows=result.to_dict(orient='records'))
+
+    return conditional(request, query_etag(current_versions()['store']), build)
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once every resource is loaded, 503 before."""
+    return jsonify(ready=resources.ready, startup=APP_STARTUP,
+                   resources=resources.status()), 200 if resources.ready else 503
+
 @app.route('/map', methods=['GET', 'POST'])
 def show_map():
-    # 1. Load the same events CSV and parse dates
-    df0 = pd.read_csv(EVENTS_CSV, parse_dates=['dataLaikas'], low_memory=False)
-    # 2. Build your filter dropdowns from the real columns
-    categories = sorted(df0['rusis'].unique())
-    years      = sorted(df0['metai'].unique())
+    # 1. Resident map points, indexed by category and year; also gives the dropdowns
+    map_store = resources.get('map_store')
 
-    # 3. Read user selections (if any)
+    # 2. Read user selections (if any)
     if request.method == 'POST':
         cat = request.form.get('category') or None
         yr  = request.form.get('year')
         yr  = int(yr) if yr else None
+        mode = request.form.get('mode') or 'auto'
     else:
-        cat, yr = None, None
+        cat, yr, mode = None, None, 'auto'
+    if mode not in MAP_MODES:
+        mode = 'auto'
 
-    # 4. Generate the map div
-    map_div = create_map_div(EVENTS_CSV, category=cat, year=yr)
+    # 3. Generate the map div (cell counts unless the filter is narrow enough for points)
+    map_div = create_map_div(map_store, category=cat, year=yr, mode=mode)
 
-    # 5. Render, passing both lists into the template
+    # 4. Render, passing both lists into the template
     return render_template(
         'map.html',
         title='Žemėlapis',
         map_div=map_div,
-        categories=categories,
-        years=years,
+        categories=map_store.categories,
+        years=map_store.years,
         selected_category=cat,
-        selected_year=yr
+        selected_year=yr,
+        modes=MAP_MODES,
+        selected_mode=mode
     )
 
+# Last, so every name the loaders use (forecast, batcher, ...) is defined
+if APP_STARTUP == 'eager':
+    resources.load_all(WARM_UP_ORDER)
+elif APP_STARTUP == 'background':
+    resources.warm_up(WARM_UP_ORDER)
+elif APP_STARTUP == 'preload':
+    resources.load_all(PRELOAD + (['model'] if model_file() == WEIGHTS_PATH else []))
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
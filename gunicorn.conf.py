@@ -0,0 +1,30 @@
+import os
+
+"""
+Production server settings, read by gunicorn from the project root:
+
+    gunicorn app:app
+    WEB_WORKERS=4 WEB_THREADS=16 gunicorn app:app
+
+app.py is imported once in the master (preload_app) with APP_STARTUP=preload,
+which loads the fork-safe data; the worker processes are forked from it and
+load the rest themselves (post_fork). Each worker serves WEB_THREADS requests
+at a time, so slow AI description calls do not hold up other requests, and
+concurrent /api/predict requests of a worker share forward passes.
+"""
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_WORKERS', 2))
+threads = int(os.getenv('WEB_THREADS', 8))
+worker_class = 'gthread'
+# Longer than DESCRIPTION_TIMEOUT, so inline AI descriptions can finish
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+preload_app = True
+accesslog = os.getenv('WEB_ACCESS_LOG') or None
+
+os.environ.setdefault('APP_STARTUP', 'preload')
+
+
+def post_fork(server, worker):
+    import app
+    app.after_fork()
@@ -0,0 +1,68 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Combines concurrent prediction requests into one forward pass. Callers
+    submit (seqs, muns) arrays and get a Future; a background thread collects
+    everything that arrives within max_wait seconds (up to max_batch rows),
+    calls predict_fn once on the concatenation and splits the result back.
+    """
+
+    def __init__(self, predict_fn, max_wait: float = 0.005, max_batch: int = 1024):
+        self.predict_fn = predict_fn
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.calls = 0
+        self.rows = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, seqs: np.ndarray, muns: np.ndarray) -> Future:
+        future = Future()
+        self._queue.put((seqs, muns, future))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._thread.start()
+        return future
+
+    def predict(self, seqs: np.ndarray, muns: np.ndarray, timeout: float = None) -> np.ndarray:
+        return self.submit(seqs, muns).result(timeout)
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            self._flush(pending)
+
+    def _flush(self, pending):
+        seqs = np.concatenate([seq for seq, _, _ in pending])
+        muns = np.concatenate([mun for _, mun, _ in pending])
+        try:
+            out = np.asarray(self.predict_fn(seqs, muns)).reshape(len(seqs), -1)
+        except Exception as e:
+            for _, _, future in pending:
+                future.set_exception(e)
+            return
+        self.calls += 1
+        self.rows += len(seqs)
+        bounds = np.cumsum([len(seq) for seq, _, _ in pending])[:-1]
+        for (_, _, future), part in zip(pending, np.split(out, bounds)):
+            future.set_result(part)
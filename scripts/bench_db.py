@@ -0,0 +1,46 @@
+import sys
+import time
+import tempfile
+from scripts.processed_store import read_events, read_participants, STORE_DIR
+from scripts.db_loader import connect, bulk_save_to_db
+from scripts.data_cleaning import save_to_db
+
+
+"""
+Measures database load throughput (rows/s) of the row-by-row save_to_db
+against the COPY-based bulk_save_to_db on the same rows. Both tables are
+truncated before each run, so point the .env settings at a scratch database
+created with sql/INIT_DB.py.
+
+Usage (from the project root): python -m scripts.bench_db [n_events] [store_dir]
+"""
+
+def truncate():
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("TRUNCATE participants, events;")
+        conn.commit()
+
+def main(n_events=20_000, store_dir=STORE_DIR):
+    events = read_events(store_dir=store_dir).head(int(n_events))
+    participants = read_participants(store_dir=store_dir)
+    participants = participants[participants['registrokodas'].isin(events['registrokodas'])]
+    rows = len(events) + len(participants)
+
+    results = []
+    with tempfile.TemporaryDirectory() as reject_dir:
+        for label, load in (
+            ('row-by-row INSERT', lambda: save_to_db(events, participants)),
+            ('COPY + staging merge', lambda: bulk_save_to_db(events, participants, reject_dir)),
+        ):
+            truncate()
+            start = time.perf_counter()
+            load()
+            results.append((label, time.perf_counter() - start))
+
+    print(f"\n{rows} rows ({len(events)} events, {len(participants)} participants)")
+    for label, seconds in results:
+        print(f"{label:<22}{seconds:>9.2f}s{rows / seconds:>12,.0f} rows/s")
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
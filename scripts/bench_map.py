@@ -0,0 +1,72 @@
+import sys
+import time
+from pyproj import Transformer
+from scripts.processed_store import read_events, STORE_DIR
+from scripts.map_visualisation import MapStore, make_scatter_map, create_map_div, viewport_geojson
+
+
+"""
+Compares the data step of a /map request: reading the store and projecting
+every coordinate on each request (as /map used to) against slicing the
+resident MapStore, for an unfiltered map, one category, one year and one
+(category, year) pair. Also times building the figure from each slice, and
+compares the HTML payload and build time of the page map in points mode
+(every event) and auto mode (grid cell counts unless the filter is narrow).
+Browser render time grows with the number of points in the payload.
+Finally times /api/map viewport queries (spatial index lookup and GeoJSON)
+for growing bounding boxes around the data centre, at event zoom.
+
+Usage (from the project root): python -m scripts.bench_map [store_dir]
+"""
+
+def timed(func, repeat=3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def per_request(store_dir, category, year):
+    years = [year] if year else range(2013, 2024)
+    df = read_events(columns=['savivaldybe', 'dataLaikas', 'rusis', 'metai', 'ilguma', 'platuma'],
+                     years=years, store_dir=store_dir)
+    transformer = Transformer.from_crs('epsg:3346', 'epsg:4326', always_xy=True)
+    df['lon'], df['lat'] = transformer.transform(df['platuma'].values, df['ilguma'].values)
+    if category:
+        df = df[df['rusis'] == category]
+    return df
+
+def main(store_dir=STORE_DIR):
+    load_time, store = timed(lambda: MapStore.from_store(store_dir), repeat=1)
+    print(f"MapStore load: {load_time:.2f} s, {len(store.df)} points, "
+          f"{store.df.memory_usage(deep=True).sum() / 2**20:.1f} MB")
+
+    category, year = store.categories[0], store.years[-1]
+    filters = [(None, None), (category, None), (None, year), (category, year)]
+    print(f"{'filter':<28}{'rows':>9}{'per request':>14}{'MapStore':>12}{'figure':>10}")
+    for cat, yr in filters:
+        old, expected = timed(lambda: per_request(store_dir, cat, yr))
+        new, result = timed(lambda: store.query(cat, yr), repeat=20)
+        fig, _ = timed(lambda: make_scatter_map(result), repeat=1)
+        assert len(result) == len(expected.dropna(subset=['lat', 'lon']))
+        label = f"{cat or '*'} / {yr or '*'}"
+        print(f"{label:<28}{len(result):>9}{old * 1000:>11.1f} ms{new * 1000:>9.2f} ms{fig:>8.2f} s")
+
+    print(f"\n{'filter':<28}{'mode':<8}{'payload':>12}{'build':>10}")
+    for cat, yr in filters:
+        label = f"{cat or '*'} / {yr or '*'}"
+        for mode in ('points', 'auto'):
+            build, div = timed(lambda: create_map_div(store, cat, yr, mode), repeat=1)
+            print(f"{label:<28}{mode:<8}{len(div) / 2**20:>9.2f} MB{build:>8.2f} s")
+
+    lat, lon = store.df['lat'].median(), store.df['lon'].median()
+    print(f"\n{'bbox size':<12}{'events':>9}{'index':>12}{'geojson':>12}")
+    for size in (0.01, 0.05, 0.2, 1.0):
+        bbox = (lon - size, lat - size / 2, lon + size, lat + size / 2)
+        lookup, (_, points) = timed(lambda: store.viewport(bbox, 13), repeat=20)
+        build, _ = timed(lambda: viewport_geojson(store, bbox, 13), repeat=5)
+        print(f"{size:<12}{len(points):>9}{lookup * 1000:>9.2f} ms{build * 1000:>9.2f} ms")
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
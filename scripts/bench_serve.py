@@ -0,0 +1,118 @@
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import joblib
+import numpy as np
+import pandas as pd
+from scripts.daily_counts import DailyCounts
+
+
+"""
+Load test of the production server (gunicorn.conf.py) at different worker
+counts. For each count a server is started on a free local port and, once
+every worker reports ready, each endpoint is requested by CONCURRENCY client
+threads for a fixed time: POST /predict for random (municipality, date)
+pairs (mostly forecast cache misses), GET /map (unfiltered, auto mode) and
+GET /visualisations (every chart; AI descriptions from the offline stand-in
+unless OPENAI_FAKE is set otherwise). Reports requests per second and p50/p99
+latency. The client runs in one process, so at very high rates it, not the
+server, can become the limit.
+
+Usage (from the project root):
+    python -m scripts.bench_serve [worker counts, e.g. 1,2,4] [seconds per endpoint] [concurrency]
+"""
+
+BASEDIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+DAILY_COUNTS_PATH = os.path.join(BASEDIR, 'data', 'processed', 'daily_counts.npz')
+LABEL_ENCODER_PATH = os.path.join(BASEDIR, 'models', 'label_encoder.joblib')
+READY_TIMEOUT = 300
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(workers, port):
+    env = {**os.environ, 'WEB_WORKERS': str(workers), 'WEB_BIND': f'127.0.0.1:{port}',
+           'TF_CPP_MIN_LOG_LEVEL': '3'}
+    env.setdefault('OPENAI_FAKE', '1')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:app'], cwd=BASEDIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # /ready is answered by any one worker: wait until enough answers in a row say ready
+    deadline, in_a_row = time.monotonic() + READY_TIMEOUT, 0
+    while in_a_row < 3 * workers:
+        if time.monotonic() > deadline or server.poll() is not None:
+            server.kill()
+            raise RuntimeError(f'server with {workers} worker(s) did not become ready')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/ready', timeout=5).read()
+            in_a_row += 1
+        except (urllib.error.URLError, ConnectionError):
+            in_a_row = 0
+            time.sleep(0.2)
+    return server
+
+def requests_for(daily, known):
+    # only municipalities the model knows, so every POST reaches the model or the forecast cache
+    municipalities = [m for m in daily.municipalities if m in known]
+    if not municipalities:
+        raise RuntimeError('no municipality of daily_counts.npz is known to the label encoder')
+    days = pd.date_range(daily.start + pd.Timedelta(days=31), daily.end + pd.Timedelta(days=1))
+
+    def predict():
+        form = {'savivaldybe': random.choice(municipalities), 'date': str(random.choice(days).date())}
+        return '/predict', urllib.parse.urlencode(form).encode()
+
+    return {
+        'POST /predict': predict,
+        'GET /map': lambda: ('/map', None),
+        'GET /visualisations': lambda: ('/visualisations', None),
+    }
+
+def load(port, request, seconds, concurrency):
+    def client():
+        latencies, errors = [], 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            path, data = request()
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', data=data, timeout=60) as r:
+                    r.read()
+                latencies.append(time.perf_counter() - start)
+            except (urllib.error.URLError, ConnectionError):
+                errors += 1
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda _: client(), range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = np.concatenate([r[0] for r in results]) if results else np.empty(0)
+    return len(latencies) / elapsed, latencies, sum(r[1] for r in results)
+
+def main(worker_counts='1,2,4', seconds=10, concurrency=16):
+    seconds, concurrency = float(seconds), int(concurrency)
+    requests = requests_for(DailyCounts.load(DAILY_COUNTS_PATH), set(joblib.load(LABEL_ENCODER_PATH).classes_))
+    print(f"{'workers':>7}  {'endpoint':<22}{'requests':>9}{'req/s':>9}{'p50':>10}{'p99':>10}{'errors':>8}")
+    for workers in (int(w) for w in str(worker_counts).split(',')):
+        port = free_port()
+        server = start_server(workers, port)
+        try:
+            for name, request in requests.items():
+                rps, latencies, errors = load(port, request, seconds, concurrency)
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if len(latencies) else (np.nan, np.nan)
+                print(f"{workers:>7}  {name:<22}{len(latencies):>9}{rps:>9.1f}{p50:>7.1f} ms{p99:>7.1f} ms{errors:>8}")
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,83 @@
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from scripts.processed_store import read_events, read_participants, store_version, STORE_DIR
+from scripts.map_visualisation import MapStore
+from scripts.visualisation import ChartAggregates
+from scripts.count_cube import CountCube
+from scripts.shared_arrays import load_shared
+
+
+"""
+Memory and startup time of N web worker processes holding the derived data
+(map index, count cube, chart aggregates): each building a private copy from
+the store, as every worker did before, against mapping the shared sets
+published by the first one. Memory is the workers' summed PSS (proportional
+set size, /proc/<pid>/smaps_rollup), which splits shared pages between the
+processes mapping them, so it is what the workers really cost together.
+
+Usage (from the project root): python -m scripts.bench_shared [store_dir] [workers]
+"""
+
+def pss_mb():
+    with open(f'/proc/{os.getpid()}/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+def builders(store_dir):
+    return {
+        'map_store': (MapStore, lambda: MapStore.from_store(store_dir)),
+        'count_cube': (CountCube, lambda: CountCube.from_store(store_dir)),
+        'chart_aggregates': (ChartAggregates, lambda: ChartAggregates.from_frames(
+            read_events(columns=['registrokodas', 'dataLaikas', 'rusis', 'metai'], store_dir=store_dir),
+            read_participants(columns=['registrokodas', 'lytis', 'amzius', 'bukle'], store_dir=store_dir))),
+    }
+
+def worker(store_dir, shared_dir, barrier, results):
+    base = pss_mb()
+    start = time.perf_counter()
+    version = store_version(store_dir)
+    loaded = {}
+    for name, (cls, build) in builders(store_dir).items():
+        loaded[name] = load_shared(name, cls, build, version, shared_dir) if shared_dir else build()
+    elapsed = time.perf_counter() - start
+    # touch the data the way requests do, so mapped pages are resident
+    loaded['map_store'].query(None, None)
+    loaded['map_store'].grid(None, None, 2.0)
+    loaded['count_cube'].query(['metai', 'lytis'])
+    barrier.wait()
+    results.put((elapsed, pss_mb(), pss_mb() - base))
+    barrier.wait()
+
+def run(store_dir, shared_dir, workers):
+    ctx = mp.get_context('spawn')
+    barrier, results = ctx.Barrier(workers), ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(store_dir, shared_dir, barrier, results))
+                 for _ in range(workers)]
+    for p in processes:
+        p.start()
+    rows = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return rows
+
+def main(store_dir=STORE_DIR, workers=4):
+    workers = int(workers)
+    print(f"{'mode':<10}{'workers':>8}{'startup':>16}{'total PSS':>12}{'data PSS':>11}")
+    with tempfile.TemporaryDirectory() as shared_dir:
+        # the shared sets are published once (by ingest or the first worker)
+        run(store_dir, shared_dir, 1)
+        for mode, directory in (('private', None), ('shared', shared_dir)):
+            rows = run(store_dir, directory, workers)
+            startup = sorted(r[0] for r in rows)
+            total = sum(r[1] for r in rows)
+            data = sum(r[2] for r in rows)
+            print(f"{mode:<10}{workers:>8}{startup[0]:>7.2f}-{startup[-1]:.2f} s"
+                  f"{total:>9.0f} MB{data:>8.0f} MB")
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
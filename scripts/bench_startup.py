@@ -0,0 +1,46 @@
+import os
+import sys
+import json
+import subprocess
+
+
+"""
+Measures web app cold start in each APP_STARTUP mode, every run in a fresh
+interpreter: time to import app.py (when a worker can accept requests),
+time to the first /ready and /predict responses, and time until every
+resource is loaded. 'eager' matches the previous import-time loading.
+
+Usage (from the project root): python -m scripts.bench_startup
+"""
+
+MODES = ('eager', 'background', 'lazy')
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+timings = {'import': time.perf_counter() - start}
+client = app.app.test_client()
+client.get('/ready')
+timings['first /ready'] = time.perf_counter() - start
+client.get('/predict')
+timings['first /predict'] = time.perf_counter() - start
+app.resources.load_all()
+timings['all loaded'] = time.perf_counter() - start
+print(json.dumps(timings))
+"""
+
+def run(mode):
+    env = {**os.environ, 'APP_STARTUP': mode, 'TF_CPP_MIN_LOG_LEVEL': '3'}
+    out = subprocess.run([sys.executable, '-c', PROBE], capture_output=True, text=True, check=True, env=env)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    results = {mode: run(mode) for mode in MODES}
+    columns = list(next(iter(results.values())))
+    print(f"{'mode':<12}" + ''.join(f'{c:>16}' for c in columns))
+    for mode, timings in results.items():
+        print(f'{mode:<12}' + ''.join(f'{timings[c]:>15.2f}s' for c in columns))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import tempfile
+import pandas as pd
+from scripts.processed_store import read_events, read_participants, STORE_DIR
+
+
+"""
+Compares the Parquet store against equivalent CSV files: size on disk, load
+time and in-memory footprint. The CSVs are exported from the store into a
+temporary directory, so the comparison uses exactly the same rows.
+
+Usage (from the project root): python -m scripts.bench_store [store_dir]
+"""
+
+def dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(path) for f in files
+    )
+
+def timed(func, repeat=3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def mb(n):
+    return f"{n / 2**20:8.1f} MB"
+
+def main(store_dir=STORE_DIR):
+    events = read_events(store_dir=store_dir)
+    participants = read_participants(store_dir=store_dir).drop(columns='metai')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        events_csv = os.path.join(tmp, 'cleaned_events.csv')
+        participants_csv = os.path.join(tmp, 'cleaned_participants.csv')
+        events.to_csv(events_csv, index=False)
+        participants.to_csv(participants_csv, index=False)
+
+        rows = [
+            ('events', 'csv', os.path.getsize(events_csv),
+             lambda: pd.read_csv(events_csv, parse_dates=['dataLaikas'], low_memory=False)),
+            ('events', 'parquet', dir_size(os.path.join(store_dir, 'events')),
+             lambda: read_events(store_dir=store_dir)),
+            ('events', 'parquet, 3 columns', None,
+             lambda: read_events(columns=['savivaldybe', 'dataLaikas', 'metai'], store_dir=store_dir)),
+            ('events', 'parquet, 1 year', None,
+             lambda: read_events(years=[max(events['metai'])], store_dir=store_dir)),
+            ('participants', 'csv', os.path.getsize(participants_csv),
+             lambda: pd.read_csv(participants_csv, low_memory=False)),
+            ('participants', 'parquet', dir_size(os.path.join(store_dir, 'participants')),
+             lambda: read_participants(store_dir=store_dir)),
+        ]
+
+        print(f"{'table':<13}{'format':<20}{'on disk':>12}{'load':>10}{'in memory':>12}")
+        for table, fmt, size, load in rows:
+            seconds, df = timed(load)
+            memory = df.memory_usage(deep=True).sum()
+            size_text = mb(size) if size is not None else ' ' * 11 + '-'
+            print(f"{table:<13}{fmt:<20}{size_text:>12}{seconds:>9.3f}s{mb(memory):>12}")
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,50 @@
+import sys
+import time
+import pandas as pd
+from scripts.processed_store import read_events, STORE_DIR
+from scripts.daily_counts import training_windows
+from scripts.model import (daily_calendar, split_days, make_dataset, build_lstm_model,
+                           BATCH_SIZE, SHUFFLE_BUFFER, LEARNING_RATE)
+
+
+"""
+Times one training epoch of the LSTM fed from materialized NumPy windows
+(batch_size=32, as before) against the tf.data pipeline that cuts windows on
+the fly, on the same chronological training split. Also reports the input
+memory each path keeps resident.
+
+Usage (from the project root): python -m scripts.bench_training [seq_len] [store_dir]
+"""
+
+def main(seq_len=30, store_dir=STORE_DIR):
+    seq_len = int(seq_len)
+    events = read_events(columns=['savivaldybe', 'dataLaikas'], store_dir=store_dir)
+    events['savivaldybe'] = events['savivaldybe'].astype(str)
+    events['date'] = events['dataLaikas'].dt.floor('d')
+    agg = events.groupby(['savivaldybe', 'date']).size().reset_index(name='accident_count')
+    agg['mun_code'] = pd.Categorical(agg['savivaldybe']).codes
+    daily = daily_calendar(agg)
+    n_mun = daily.counts.shape[0]
+    train_days = split_days(daily)['train']
+
+    X, y, mun, dates = training_windows(daily, seq_len)
+    mask = dates < (daily.start + pd.Timedelta(days=train_days[1])).to_datetime64()
+    X_train, y_train, mun_train = X[mask].astype('float32'), y[mask], mun[mask]
+
+    model = build_lstm_model(n_mun, seq_len)
+    start = time.perf_counter()
+    model.fit([X_train, mun_train], y_train, epochs=1, batch_size=32, verbose=0)
+    numpy_time = time.perf_counter() - start
+
+    model = build_lstm_model(n_mun, seq_len, learning_rate=LEARNING_RATE)
+    train_ds = make_dataset(daily, seq_len, train_days, BATCH_SIZE, shuffle_buffer=SHUFFLE_BUFFER, seed=42)
+    start = time.perf_counter()
+    model.fit(train_ds, epochs=1, verbose=0)
+    dataset_time = time.perf_counter() - start
+
+    print(f"\n{len(y_train)} training windows, seq_len={seq_len}")
+    print(f"{'NumPy arrays, batch 32':<28}{numpy_time:>8.1f}s/epoch{X_train.nbytes / 2**20:>10.1f} MB inputs")
+    print(f"{f'tf.data, batch {BATCH_SIZE}':<28}{dataset_time:>8.1f}s/epoch{daily.counts.nbytes / 2**20:>10.1f} MB inputs")
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,61 @@
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from scripts.processed_store import read_events, STORE_DIR
+from scripts.daily_counts import DailyCounts, training_windows
+
+
+"""
+Compares training window generation of the previous Python loop (windows
+over accident days only) with the vectorized engine over the dense daily
+calendar, for seq_len from 30 to 365: time, peak allocated memory and bytes
+per sample.
+
+Usage (from the project root): python -m scripts.bench_windows [store_dir]
+"""
+
+SEQ_LENS = (30, 60, 90, 180, 365)
+
+
+def loop_windows(agg, seq_len):
+    X, y, mun_ids = [], [], []
+    for mun_id, grp in agg.groupby('mun_code'):
+        grp = grp.sort_values('date')
+        counts = grp['accident_count'].values
+        for i in range(len(counts) - seq_len):
+            X.append(counts[i:i+seq_len])
+            y.append(counts[i+seq_len])
+            mun_ids.append(mun_id)
+    dates = np.concatenate([grp['date'].values[seq_len:] for _, grp in agg.groupby('mun_code')])
+    return np.array(X).reshape(-1, seq_len, 1), np.array(y), np.array(mun_ids), dates
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, len(result[1])
+
+
+def main(store_dir=STORE_DIR):
+    events = read_events(columns=['savivaldybe', 'dataLaikas'], store_dir=store_dir)
+    events['savivaldybe'] = events['savivaldybe'].astype(str)
+    events['date'] = events['dataLaikas'].dt.floor('d')
+    agg = events.groupby(['savivaldybe', 'date']).size().reset_index(name='accident_count')
+    agg['mun_code'] = pd.Categorical(agg['savivaldybe']).codes
+    daily = DailyCounts.from_aggregated(agg)
+
+    print(f"{'seq_len':>7} {'method':<11}{'samples':>10}{'time':>10}{'peak mem':>12}{'B/sample':>10}")
+    for seq_len in SEQ_LENS:
+        for label, func, arg in (('loop', loop_windows, agg), ('vectorized', training_windows, daily)):
+            seconds, peak, n = measure(func, arg, seq_len)
+            print(f"{seq_len:>7} {label:<11}{n:>10}{seconds:>9.3f}s{peak / 2**20:>9.1f} MB{peak / max(n, 1):>10.0f}")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
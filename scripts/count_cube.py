@@ -0,0 +1,290 @@
+import argparse
+import os
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from scripts.processed_store import read_events, read_participants, STORE_DIR
+from scripts.visualisation import AGE_BINS, AGE_LABELS
+
+"""
+Precomputed count cube over the main event and participant dimensions.
+
+Two cuboids at the finest grain are kept: event counts by EVENT_DIMS and
+participant counts by the event dimensions of PARTICIPANT_EVENT_DIMS plus
+PARTICIPANT_DIMS (participants joined to their event). Dimension values are
+stored as integer codes, so any roll-up (by) and slice (where) of them is a
+mask and a bincount over a cuboid instead of a scan of the tables.
+
+Usage (from the project root):
+    python -m scripts.count_cube --by metai,rusis --where metai=2022,2023
+    python -m scripts.count_cube --by lytis,bukle --where rusis=Susidūrimas
+    python -m scripts.count_cube --build       (rewrites data/processed/count_cube.npz)
+"""
+
+CUBE_PATH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'processed', 'count_cube.npz'
+))
+EVENT_DIMS = ['metai', 'menuo', 'savivaldybe', 'rusis', 'dangosBukle', 'meteoSalygos',
+              'parosMetas', 'kelioApsvietimas']
+PARTICIPANT_EVENT_DIMS = ['metai', 'menuo', 'savivaldybe', 'rusis', 'dangosBukle', 'meteoSalygos']
+PARTICIPANT_DIMS = ['lytis', 'amziausGrupe', 'bukle', 'kategorija', 'dalyvioBusena']
+MEASURES = ('events', 'participants')
+# Largest number of by-value combinations counted into a dense array
+DENSE_KEYS = 1 << 22
+# Number of derived roll-ups kept in memory
+ROLLUP_CACHE = 256
+
+
+class Cuboid:
+    """
+    Counts at one grain: codes (n_rows, n_dims) into per-dimension value
+    arrays, and a count per row.
+    """
+
+    def __init__(self, dims: list, values: list, codes: np.ndarray, counts: np.ndarray):
+        self.dims = list(dims)
+        self.values = [pd.Index(v) for v in values]
+        self.codes = codes
+        self.counts = counts
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dims: list) -> 'Cuboid':
+        values, codes = [], []
+        for dim in dims:
+            col = df[dim]
+            if not pd.api.types.is_numeric_dtype(col):
+                col = col.astype(str)
+            code, uniques = pd.factorize(col, sort=True, use_na_sentinel=False)
+            values.append(uniques)
+            codes.append(code)
+        codes = np.stack(codes, axis=1) if dims else np.zeros((len(df), 0), dtype=np.int64)
+        rows, counts = np.unique(codes, axis=0, return_counts=True)
+        code_type = np.int16 if max(map(len, values), default=0) <= np.iinfo(np.int16).max else np.int32
+        return cls(dims, values, rows.astype(code_type), counts.astype(np.int64))
+
+    def code_of(self, dim: str, value) -> int:
+        values = self.values[self.dims.index(dim)]
+        if pd.api.types.is_numeric_dtype(values):
+            try:
+                value = values.dtype.type(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{dim}: {value!r} is not a number') from None
+            except OverflowError:
+                return -1  # outside the column's range, so it never occurs
+        else:
+            value = str(value)
+        position = values.get_indexer([value])[0]
+        return position  # -1 when the value never occurs
+
+    def slice(self, where: dict) -> 'Cuboid':
+        """Rows whose value of every dimension in where is one of the wanted values."""
+        mask = np.ones(len(self.counts), dtype=bool)
+        for dim, wanted in where.items():
+            codes = [self.code_of(dim, v) for v in wanted]
+            mask &= np.isin(self.codes[:, self.dims.index(dim)], codes)
+        return Cuboid(self.dims, self.values, self.codes[mask], self.counts[mask])
+
+    def rollup(self, dims: list) -> 'Cuboid':
+        """Counts summed over every dimension not in dims."""
+        positions = [self.dims.index(dim) for dim in dims]
+        sizes = [len(self.values[p]) for p in positions]
+        key = np.zeros(len(self.counts), dtype=np.int64)
+        for p, size in zip(positions, sizes):
+            key = key * size + self.codes[:, p].astype(np.int64)
+        if np.prod(sizes, dtype=np.float64) <= DENSE_KEYS:
+            totals = np.bincount(key, weights=self.counts, minlength=int(np.prod(sizes)))
+            present = np.flatnonzero(totals)
+            totals = totals[present]
+        else:
+            # too many combinations for a dense array: group the keys that occur
+            present, inverse = np.unique(key, return_inverse=True)
+            totals = np.bincount(inverse, weights=self.counts)
+
+        codes = np.empty((len(present), len(dims)), dtype=self.codes.dtype)
+        for j in reversed(range(len(dims))):
+            codes[:, j] = present % sizes[j]
+            present = present // sizes[j]
+        return Cuboid(dims, [self.values[p] for p in positions], codes, totals.astype(np.int64))
+
+    def to_frame(self) -> pd.DataFrame:
+        result = pd.DataFrame({dim: self.values[j][self.codes[:, j]] for j, dim in enumerate(self.dims)})
+        result['count'] = self.counts
+        return result
+
+
+class CountCube:
+    """
+    The events and participants cuboids with query(by, where, measure):
+    counts of events (default, if every dimension is an event dimension) or
+    of participants, grouped by the dimensions in by and filtered by where
+    ({dimension: [values]}), largest first.
+
+    A query runs on the roll-up of its dimensions (by and where), which is
+    derived once from the smallest cuboid that covers them and kept (up to
+    ROLLUP_CACHE of them), so repeated breakdowns touch a few hundred rows
+    instead of the finest grain.
+    """
+
+    def __init__(self, events: Cuboid, participants: Cuboid):
+        self.cuboids = {'events': events, 'participants': participants}
+        self._rollups = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def dims(self) -> dict:
+        return {measure: cuboid.dims for measure, cuboid in self.cuboids.items()}
+
+    @classmethod
+    def from_frames(cls, events_df: pd.DataFrame, participants_df: pd.DataFrame) -> 'CountCube':
+        if 'menuo' not in events_df:
+            events_df = events_df.assign(menuo=events_df['dataLaikas'].dt.month)
+        joined = participants_df.merge(events_df[['registrokodas'] + PARTICIPANT_EVENT_DIMS], on='registrokodas')
+        joined['amziausGrupe'] = pd.cut(pd.to_numeric(joined['amzius'], errors='coerce'),
+                                        bins=AGE_BINS, labels=AGE_LABELS, right=False).astype(str)
+        return cls(Cuboid.from_frame(events_df, EVENT_DIMS),
+                   Cuboid.from_frame(joined, PARTICIPANT_EVENT_DIMS + PARTICIPANT_DIMS))
+
+    @classmethod
+    def from_store(cls, store_dir: str = STORE_DIR) -> 'CountCube':
+        events_df = read_events(columns=['registrokodas'] + EVENT_DIMS, store_dir=store_dir)
+        participants_df = read_participants(
+            columns=['registrokodas', 'amzius'] + [d for d in PARTICIPANT_DIMS if d != 'amziausGrupe'],
+            store_dir=store_dir)
+        return cls.from_frames(events_df, participants_df)
+
+    def query(self, by=(), where=None, measure: str = None) -> pd.DataFrame:
+        by, where = list(by), dict(where or {})
+        measure = self.check(by, where, measure)
+        needed = by + [dim for dim in where if dim not in by]
+        result = self._rollup(measure, needed).slice(where).rollup(by).to_frame()
+        return result.sort_values('count', ascending=False, kind='stable').reset_index(drop=True)
+
+    def check(self, by=(), where=None, measure: str = None) -> str:
+        """
+        Validates a query without running it: raises ValueError for unknown
+        measures or dimensions, repeated by dimensions and where values of
+        the wrong type. Returns the measure the query counts.
+        """
+        by, where = list(by), dict(where or {})
+        used = set(by) | set(where)
+        if measure is None:
+            measure = 'events' if used <= set(EVENT_DIMS) else 'participants'
+        if measure not in self.cuboids:
+            raise ValueError(f'unknown measure {measure!r}, expected one of {", ".join(MEASURES)}')
+        cuboid = self.cuboids[measure]
+        unknown = sorted(used - set(cuboid.dims))
+        if unknown:
+            raise ValueError(f'unknown {measure} dimension(s): {", ".join(unknown)}; '
+                             f'available: {", ".join(cuboid.dims)}')
+        if len(set(by)) != len(by):
+            raise ValueError('repeated dimension in by')
+        for dim, values in where.items():
+            for value in values:
+                cuboid.code_of(dim, value)
+        return measure
+
+    def _rollup(self, measure: str, dims: list) -> Cuboid:
+        base = self.cuboids[measure]
+        if set(dims) == set(base.dims):
+            return base
+        key = (measure, frozenset(dims))
+        with self._lock:
+            cuboid = self._rollups.get(key)
+            if cuboid is not None:
+                self._rollups.move_to_end(key)
+                return cuboid
+            covering = [c for (m, d), c in self._rollups.items() if m == measure and d >= key[1]]
+        source = min(covering, key=lambda c: len(c.counts), default=base)
+        cuboid = source.rollup(dims)
+        with self._lock:
+            self._rollups[key] = cuboid
+            while len(self._rollups) > ROLLUP_CACHE:
+                self._rollups.popitem(last=False)
+        return cuboid
+
+    def to_arrays(self):
+        """Arrays and (empty) meta for np.savez or shared_arrays.publish()."""
+        arrays = {}
+        for measure, cuboid in self.cuboids.items():
+            arrays[f'{measure}_dims'] = np.array(cuboid.dims)
+            arrays[f'{measure}_codes'] = cuboid.codes
+            arrays[f'{measure}_counts'] = cuboid.counts
+            for dim, values in zip(cuboid.dims, cuboid.values):
+                values = values.to_numpy()
+                arrays[f'{measure}_values_{dim}'] = values if values.dtype != object else values.astype(str)
+        return arrays, {}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta: dict = None) -> 'CountCube':
+        """From to_arrays() output; codes and counts are used as given (e.g. memory-mapped)."""
+        cuboids = []
+        for measure in MEASURES:
+            dims = [str(d) for d in arrays[f'{measure}_dims']]
+            cuboids.append(Cuboid(dims, [arrays[f'{measure}_values_{dim}'] for dim in dims],
+                                  arrays[f'{measure}_codes'], arrays[f'{measure}_counts']))
+        return cls(*cuboids)
+
+    def save(self, path: str = CUBE_PATH):
+        np.savez(path, **self.to_arrays()[0])
+
+    @classmethod
+    def load(cls, path: str = CUBE_PATH) -> 'CountCube':
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_arrays({key: data[key] for key in data.files})
+
+
+"""
+Parses 'dim=v1,v2' filters (several may be given, or joined with ';') into
+{dim: [v1, v2]}.
+"""
+def parse_where(filters) -> dict:
+    if isinstance(filters, str):
+        filters = [filters]
+    where = {}
+    for part in (p for f in filters or [] for p in f.split(';')):
+        if not part.strip():
+            continue
+        dim, sep, values = part.partition('=')
+        if not sep or not values:
+            raise ValueError(f'filter {part!r} must look like dimension=value[,value...]')
+        where.setdefault(dim.strip(), []).extend(v.strip() for v in values.split(','))
+    return where
+
+def parse_by(by: str) -> list:
+    return [dim.strip() for dim in (by or '').split(',') if dim.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m scripts.count_cube',
+                                     description='Counts of events or participants from the count cube.')
+    parser.add_argument('--by', default='', help='comma separated dimensions, e.g. metai,rusis')
+    parser.add_argument('--where', action='append', default=[], help='filter dimension=value[,value...]')
+    parser.add_argument('--measure', choices=MEASURES, help='events or participants (default: by dimensions)')
+    parser.add_argument('--top', type=int, default=0, help='print only the largest N rows')
+    parser.add_argument('--build', action='store_true', help='rebuild the cube file from the store')
+    parser.add_argument('--store', default=STORE_DIR)
+    parser.add_argument('--cube', default=CUBE_PATH)
+    args = parser.parse_args(argv)
+
+    if args.build or not os.path.exists(args.cube):
+        cube = CountCube.from_store(args.store)
+        cube.save(args.cube)
+    else:
+        cube = CountCube.load(args.cube)
+
+    if args.build and not args.by and not args.where:
+        for measure, dims in cube.dims.items():
+            print(f"{measure}: {len(cube.cuboids[measure].counts)} cells over {', '.join(dims)}")
+        return
+
+    try:
+        result = cube.query(parse_by(args.by), parse_where(args.where), args.measure)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.top:
+        result = result.head(args.top)
+    print(result.to_string(index=False))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
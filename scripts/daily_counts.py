@@ -0,0 +1,149 @@
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+class DailyCounts:
+    """
+    Dense, gap-filled matrix of accident counts: one int32 row per
+    municipality and one column per calendar day from `start`. Days without
+    accidents are zeros, so any input window is a plain slice.
+    """
+
+    def __init__(self, municipalities, start, counts: np.ndarray):
+        self.municipalities = [str(m) for m in municipalities]
+        self.index = {m: i for i, m in enumerate(self.municipalities)}
+        self.start = pd.Timestamp(start).normalize()
+        self.counts = counts
+        # Column of each municipality's last recorded accident (-1 if none)
+        nonzero = counts > 0
+        has_any = nonzero.any(axis=1)
+        if counts.shape[1]:
+            last = counts.shape[1] - 1 - np.argmax(nonzero[:, ::-1], axis=1)
+        else:
+            last = np.full(counts.shape[0], -1)
+        self.last_day = np.where(has_any, last, -1)
+
+    @property
+    def n_days(self) -> int:
+        return self.counts.shape[1]
+
+    @property
+    def end(self) -> pd.Timestamp:
+        return self.start + pd.Timedelta(days=self.n_days - 1)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, date_col: str, weight_col: str = None,
+                   municipalities=None) -> 'DailyCounts':
+        """
+        Builds the matrix from rows with 'savivaldybe' and a date column. Each
+        row counts as one accident, or as weight_col accidents if given.
+        Raises ValueError if no row has a date, since the matrix would have
+        no start.
+        """
+        if municipalities is None:
+            municipalities = np.unique(df['savivaldybe'].astype(str))
+        municipalities = [str(m) for m in municipalities]
+        dates = pd.to_datetime(df[date_col]).dt.floor('d')
+        start, end = dates.min(), dates.max()
+        if pd.isna(start):
+            raise ValueError(f'no rows with a {date_col} to count')
+        n_days = (end - start).days + 1
+
+        rows = pd.Categorical(df['savivaldybe'].astype(str), categories=municipalities).codes
+        days = (dates - start).dt.days.to_numpy()
+        keep = (rows >= 0) & ~np.isnan(days)
+        flat = rows[keep].astype(np.int64) * n_days + days[keep].astype(np.int64)
+        weights = None if weight_col is None else df[weight_col].to_numpy()[keep]
+        counts = np.bincount(flat, weights=weights, minlength=len(municipalities) * n_days)
+        counts = counts.astype(np.int32).reshape(len(municipalities), n_days)
+        return cls(municipalities, start, counts)
+
+    @classmethod
+    def from_events(cls, events_df: pd.DataFrame, municipalities=None) -> 'DailyCounts':
+        return cls.from_frame(events_df, 'dataLaikas', municipalities=municipalities)
+
+    @classmethod
+    def from_aggregated(cls, agg_df: pd.DataFrame, municipalities=None) -> 'DailyCounts':
+        """From ['savivaldybe', 'date', 'accident_count'] rows (scripts/model.py)."""
+        return cls.from_frame(agg_df, 'date', 'accident_count', municipalities)
+
+    def day(self, date) -> int:
+        return (pd.Timestamp(date).normalize() - self.start).days
+
+    def window(self, municipality: str, seq_len: int, end_day: int = None) -> np.ndarray:
+        """
+        Counts of the seq_len days ending at column end_day (inclusive),
+        shaped (1, seq_len, 1) for the model. By default the window ends at
+        the municipality's last recorded accident. Days before the first
+        column are zeros.
+        """
+        row = self.index[municipality]
+        if end_day is None:
+            end_day = self.last_day[row]
+        first = end_day - seq_len + 1
+        if first >= 0:
+            seq = self.counts[row, first:end_day + 1]
+        else:
+            seq = np.zeros(seq_len, dtype=self.counts.dtype)
+            seq[-first:] = self.counts[row, :end_day + 1]
+        return seq.reshape(1, seq_len, 1)
+
+    def fingerprint(self) -> str:
+        """Short content hash, used as the data version of cached predictions."""
+        digest = hashlib.sha256()
+        digest.update('\n'.join(self.municipalities).encode('utf-8'))
+        digest.update(str(self.start.date()).encode('ascii'))
+        digest.update(np.ascontiguousarray(self.counts).tobytes())
+        return digest.hexdigest()[:16]
+
+    def to_arrays(self):
+        """Arrays and (empty) meta for np.savez or shared_arrays.publish()."""
+        return {'municipalities': np.array(self.municipalities),
+                'start': np.array(self.start.to_datetime64()), 'counts': self.counts}, {}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta: dict = None) -> 'DailyCounts':
+        """From to_arrays() output; counts are used as given (e.g. memory-mapped)."""
+        return cls(arrays['municipalities'], arrays['start'][()], arrays['counts'])
+
+    def save(self, path: str):
+        np.savez(path, **self.to_arrays()[0])
+
+    @classmethod
+    def load(cls, path: str) -> 'DailyCounts':
+        with np.load(path) as data:
+            return cls.from_arrays(data)
+
+
+def sliding_windows(counts: np.ndarray, seq_len: int):
+    """
+    Strided views (no copies) over a (n_mun, n_days) matrix: inputs of shape
+    (n_mun, n_days - seq_len, seq_len) and targets of shape
+    (n_mun, n_days - seq_len), where target [m, t] is the day right after
+    input window [m, t].
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(counts, seq_len + 1, axis=1)
+    return windows[..., :seq_len], windows[..., seq_len]
+
+
+def training_windows(daily: DailyCounts, seq_len: int):
+    """
+    All training samples of a dense daily calendar in one pass. Returns
+    X (N, seq_len, 1), y (N,), mun (N,) with the matrix row (= mun_code) and
+    dates (N,) with each target's day. Zero-accident days are included, so
+    every window spans exactly seq_len calendar days.
+
+    X and y are copies (X is seq_len times the size of the matrix): the
+    windows of all municipalities cannot be one strided view. sliding_windows() gives the
+    same windows as views, and model.py's training pipeline cuts them from
+    the matrix batch by batch instead of calling this.
+    """
+    X_view, y_view = sliding_windows(daily.counts, seq_len)
+    n_mun, n_win = y_view.shape
+    X = X_view.reshape(n_mun * n_win, seq_len, 1)  # copies
+    y = y_view.reshape(-1)
+    mun = np.repeat(np.arange(n_mun, dtype=np.int32), n_win)
+    target_days = daily.start.to_datetime64() + np.arange(seq_len, seq_len + n_win).astype('timedelta64[D]')
+    dates = np.tile(target_days, n_mun)
+    return X, y, mun, dates
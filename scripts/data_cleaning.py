@@ -1,8 +1,15 @@
 import pandas as pd
 import os
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 import psycopg2
-from scripts.data_loading import load_all_jsons
+from scripts.data_loading import iter_file_batches, list_raw_files, DEFAULT_CHUNK_SIZE, RAW_SUFFIXES
+from scripts.manifest import load_manifest, save_manifest, diff_manifest
+from scripts import processed_store
+from scripts.daily_counts import DailyCounts
+from scripts.count_cube import CountCube
+from scripts.geo import to_wgs84
+from scripts.db_loader import sync_to_db, refresh_aggregates, without_placeholder_ids
 
 load_dotenv()
 
@@ -18,6 +25,22 @@ RAW_DATA_DIR = '../data/raw/'
 PROCESSED_DIR = '../data/processed/'
 os.makedirs(PROCESSED_DIR, exist_ok=True)
 
+# Columnar store of cleaned data. Each raw file writes its own fragments, so
+# only new or changed files have to be reprocessed
+STORE_DIR = os.path.join(PROCESSED_DIR, 'store')
+MANIFEST_PATH = os.path.join(PROCESSED_DIR, 'manifest.json')
+DAILY_COUNTS_PATH = os.path.join(PROCESSED_DIR, 'daily_counts.npz')
+COUNT_CUBE_PATH = os.path.join(PROCESSED_DIR, 'count_cube.npz')
+
+# Number of raw records parsed and cleaned at a time
+CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+# Number of raw files parsed in parallel (defaults to the CPU count)
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 0)) or None
+# 'copy' (or 'sync') sends the rows of every processed file through COPY into
+# staging tables and an upsert that skips unchanged rows, 'rows' inserts row by row
+DB_LOAD_MODE = os.getenv('DB_LOAD_MODE', 'copy')
+REJECT_DIR = os.path.join(PROCESSED_DIR, 'rejects')
+
 def clean_events(df):
     selected_columns = [
         "registrokodas", "dataLaikas", "savivaldybe", "ivykioVieta",
@@ -27,7 +50,7 @@ def clean_events(df):
         "zuvVaiku", "suzeistuSkaicius", "suzeistaVaiku", "ilguma",
         "platuma", "leistinasGreitis"
     ]
-    df = df[selected_columns].copy()
+    df = df.reindex(columns=selected_columns)
 
     # Date and time
     df['dataLaikas'] = pd.to_datetime(df['dataLaikas'], format='%Y-%m-%d %H:%M')
@@ -47,22 +70,44 @@ def clean_events(df):
         else:
             df[col].fillna(0, inplace=True)
 
+    # Map coordinates, projected once here instead of on every map request
+    df['lat'], df['lon'] = to_wgs84(df['platuma'], df['ilguma'])
+
     return df
 
-def clean_participants(df):
-    participants = pd.json_normalize(
-        df.to_dict(orient='records'),
-        record_path='eismoDalyviai',
-        meta=['registrokodas']
-    )
+PARTICIPANT_COLUMNS = [
+    "dalyvisId", "registrokodas", "kategorija", "lytis", "amzius",
+    "bukle", "busena", "girtumasPromilemis", "kaltininkas", "dalyvioBusena",
+    "vairavimoStazas", "dalyvioKetPazeidimai"
+]
+# A chunk in which one of these is missing from every record gets a float
+# column (filled with 0), as other chunks do, instead of an object one
+NUMERIC_PARTICIPANT_COLUMNS = ("amzius", "girtumasPromilemis", "vairavimoStazas")
 
-    selected_columns = [
-        "dalyvisId", "registrokodas", "kategorija", "lytis", "amzius",
-        "bukle", "busena", "girtumasPromilemis", "kaltininkas", "dalyvioBusena",
-        "vairavimoStazas", "dalyvioKetPazeidimai"
-    ]
-    participants = participants[selected_columns].copy()
+"""
+Flattens the nested eismoDalyviai lists into one list per selected column,
+carrying each event's registrokodas as the foreign key. Gives the same frame
+as json_normalize(record_path='eismoDalyviai', meta=['registrokodas']) but
+touches only the two fields it needs and runs in time linear in participants.
+"""
+def flatten_participants(codes, participant_lists):
+    flat, fk = [], []
+    for code, plist in zip(codes, participant_lists):
+        if isinstance(plist, list):
+            flat.extend(plist)
+            fk.extend([code] * len(plist))
 
+    columns = {
+        col: fk if col == 'registrokodas' else [p.get(col) for p in flat]
+        for col in PARTICIPANT_COLUMNS
+    }
+    participants = pd.DataFrame(columns, columns=PARTICIPANT_COLUMNS)
+    for col in NUMERIC_PARTICIPANT_COLUMNS:
+        if participants[col].isna().all():
+            participants[col] = participants[col].astype('float64')
+    return participants
+
+def _clean_participant_columns(participants):
     # Convert 'kaltininkas' to boolean
     participants['kaltininkas'] = participants['kaltininkas'].astype(str).str.lower().map({
         'taip': True,
@@ -78,6 +123,20 @@ def clean_participants(df):
 
     return participants
 
+def clean_participants(df):
+    participants = flatten_participants(df['registrokodas'].values, df['eismoDalyviai'].values)
+    return _clean_participant_columns(participants)
+
+"""
+Same as clean_participants, but reads straight from raw (not normalized) records.
+"""
+def clean_participant_records(records):
+    participants = flatten_participants(
+        [r.get('registrokodas') for r in records],
+        [r.get('eismoDalyviai') for r in records]
+    )
+    return _clean_participant_columns(participants)
+
 def save_to_db(events_df, participants_df):
     with psycopg2.connect(
         dbname=DB_NAME,
@@ -102,7 +161,7 @@ def save_to_db(events_df, participants_df):
                             %(platuma)s, %(leistinasGreitis)s, %(metai)s, %(menuo)s,
                             %(diena)s, %(valanda)s
                         )
-                        ON CONFLICT (registrokodas) DO NOTHING;
+                        ON CONFLICT (registrokodas, dataLaikas) DO NOTHING;
                     """, row.to_dict())
                     success += 1
                 except Exception as e:
@@ -113,13 +172,14 @@ def save_to_db(events_df, participants_df):
 
             print(f"Total inserted into events: {success}, errors: {fail}")
 
-            cursor.execute("SELECT registrokodas FROM events;")
-            existing_codes = set(code[0] for code in cursor.fetchall())
-
-            before = len(participants_df)
-            participants_df = participants_df[participants_df['registrokodas'].isin(existing_codes)]
-            print(f"Filtered participants: {len(participants_df)} out of {before}")
-
+            # Participants without a stored event are skipped by the server.
+            # Those without a dalyvisId (NULL) never conflict, so the ones
+            # of these events stored before are replaced
+            participants_df = without_placeholder_ids(participants_df)
+            cursor.execute(
+                "DELETE FROM participants WHERE dalyvisId IS NULL AND registrokodas = ANY(%s);",
+                (events_df['registrokodas'].astype(str).tolist(),)
+            )
             success, fail = 0, 0
             for _, row in participants_df.iterrows():
                 try:
@@ -127,12 +187,13 @@ def save_to_db(events_df, participants_df):
                         INSERT INTO participants (
                             dalyvisId, registrokodas, kategorija, lytis, amzius, bukle, busena,
                             girtumasPromilemis, kaltininkas, dalyvioBusena, vairavimoStazas, dalyvioKetPazeidimai
-                        ) VALUES (
+                        ) SELECT
                             %(dalyvisId)s, %(registrokodas)s, %(kategorija)s, %(lytis)s, %(amzius)s, %(bukle)s, %(busena)s,
                             %(girtumasPromilemis)s, %(kaltininkas)s, %(dalyvioBusena)s, %(vairavimoStazas)s, %(dalyvioKetPazeidimai)s
-                        );
+                        WHERE EXISTS (SELECT 1 FROM events WHERE registrokodas = %(registrokodas)s)
+                        ON CONFLICT (registrokodas, dalyvisId) DO NOTHING;
                     """, row.to_dict())
-                    success += 1
+                    success += cursor.rowcount
                 except Exception as e:
                     fail += 1
                     print(f"Error inserting into participants: {e}")
@@ -143,25 +204,105 @@ def save_to_db(events_df, participants_df):
             conn.commit()
             print("Data successfully written to the database.")
 
-if __name__ == "__main__":
-    print("Starting data import...")
-    df = load_all_jsons(RAW_DATA_DIR)
-    print(f"Total records loaded: {df.shape[0]}")
+"""
+Store part name of a raw file: its name without the raw suffix (so
+'ei_2023.v2.json.gz' -> 'ei_2023.v2'). Its chunks are written as parts
+'<name>-<chunk number>'.
+"""
+def part_name(file_name):
+    for suffix in sorted(RAW_SUFFIXES, key=len, reverse=True):
+        if file_name.endswith(suffix):
+            return file_name[:-len(suffix)]
+    return file_name
+
+"""
+Parses, cleans and year-filters one raw file chunk by chunk and writes its
+fragments to the processed store. Runs inside a worker process.
+"""
+def process_raw_file(file_path):
+    name = part_name(os.path.basename(file_path))
+    processed_store.remove_parts(name, STORE_DIR)
+    n_records, n_events, n_participants = 0, 0, 0
+    for i, batch in enumerate(iter_file_batches(file_path, chunk_size=CHUNK_SIZE)):
+        df = pd.json_normalize(batch)
+        n_records += df.shape[0]
+
+        events_df = clean_events(df)
+        participants_df = clean_participant_records(batch)
+
+        events_df = events_df[(events_df['metai'] >= 2013) & (events_df['metai'] <= 2023)].copy()
 
-    events_df = clean_events(df)
-    participants_df = clean_participants(df)
+        valid_codes = set(events_df["registrokodas"])
+        participants_df = participants_df[
+            participants_df["registrokodas"].isin(valid_codes)
+        ].copy()
 
-    events_df = events_df[(events_df['metai'] >= 2013) & (events_df['metai'] <= 2023)].copy()
-    print(f"Events after year‐filter: {events_df.shape[0]}")
+        processed_store.write_frames(events_df, participants_df, f'{name}-{i}', STORE_DIR)
+        n_events += events_df.shape[0]
+        n_participants += participants_df.shape[0]
+    return n_records, n_events, n_participants
 
-    valid_codes = set(events_df["registrokodas"])
-    participants_df = participants_df[
-        participants_df["registrokodas"].isin(valid_codes)
-    ].copy()
-    print(f"Participants after matching to filtered events: {participants_df.shape[0]}")
+"""
+Processes only new or changed raw files (across a process pool) into the
+processed store and marks them in the manifest as not yet in the database.
+"""
+def run_ingest(raw_dir=RAW_DATA_DIR, workers=INGEST_WORKERS):
+    manifest = load_manifest(MANIFEST_PATH)
+    raw_files = list_raw_files(raw_dir)
+    pending, removed = diff_manifest(manifest, raw_files)
+    print(f"Raw files: {len(raw_files)}, new or changed: {len(pending)}, removed: {len(removed)}")
 
-    events_df.to_csv(os.path.join(PROCESSED_DIR, 'cleaned_events.csv'), index=False, encoding='utf-8')
-    participants_df.to_csv(os.path.join(PROCESSED_DIR, 'cleaned_participants.csv'), index=False, encoding='utf-8')
+    for name in removed:
+        processed_store.remove_parts(part_name(name), STORE_DIR)
+        del manifest[name]
 
-    save_to_db(events_df, participants_df)
-    print(f'Saved: {events_df.shape[0]} events and {participants_df.shape[0]} participants.')
+    paths = {os.path.basename(p): p for p in raw_files}
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(process_raw_file, [paths[name] for name in pending])
+            for name, (n_records, n_events, n_participants) in zip(pending, results):
+                print(f"{name}: {n_records} records, {n_events} events, {n_participants} participants")
+                manifest[name] = dict(pending[name], events=n_events, participants=n_participants,
+                                      db_synced=False)
+                save_manifest(manifest, MANIFEST_PATH)
+    else:
+        save_manifest(manifest, MANIFEST_PATH)
+
+    # the cube first: the web app reloads its data when daily_counts.npz changes
+    if pending or removed or not os.path.exists(COUNT_CUBE_PATH):
+        CountCube.from_store(STORE_DIR).save(COUNT_CUBE_PATH)
+    if pending or removed or not os.path.exists(DAILY_COUNTS_PATH):
+        events = processed_store.read_events(columns=['savivaldybe', 'dataLaikas'], store_dir=STORE_DIR)
+        DailyCounts.from_events(events).save(DAILY_COUNTS_PATH)
+
+"""
+Sends every processed file not yet in the database in full (also files whose
+load failed in an earlier run); the database skips rows whose content hash
+did not change. A file is marked synced in the manifest only once loaded.
+Returns the number of events and participants sent.
+"""
+def sync_database():
+    manifest = load_manifest(MANIFEST_PATH)
+    unsynced = sorted(name for name, entry in manifest.items() if not entry.get('db_synced', True))
+    total_events, total_participants = 0, 0
+    for name in unsynced:
+        events_df = processed_store.read_parts('events', part_name(name), STORE_DIR)
+        participants_df = processed_store.read_parts('participants', part_name(name), STORE_DIR)
+        if DB_LOAD_MODE == 'rows':
+            save_to_db(events_df, participants_df)
+        else:
+            sync_to_db(events_df, participants_df, REJECT_DIR)
+        manifest[name]['db_synced'] = True
+        save_manifest(manifest, MANIFEST_PATH)
+        total_events += events_df.shape[0]
+        total_participants += participants_df.shape[0]
+
+    if unsynced:
+        refresh_aggregates()
+    return total_events, total_participants
+
+if __name__ == "__main__":
+    print("Starting data import...")
+    run_ingest()
+    total_events, total_participants = sync_database()
+    print(f'Processed: {total_events} events and {total_participants} participants.')
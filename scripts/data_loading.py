@@ -1,14 +1,112 @@
 import os
+import io
+import gzip
 import json
 import pandas as pd
 
 
+RAW_SUFFIXES = ('.json', '.json.gz', '.json.zst')
+DEFAULT_CHUNK_SIZE = 50_000
+READ_BLOCK_SIZE = 1 << 20
+
+
+"""
+Opens a raw JSON file as a text stream. Files ending in .gz or .zst are
+decompressed on the fly.
+"""
+def open_raw_file(file_path):
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt', encoding='utf-8')
+    if file_path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("Reading .zst files requires the 'zstandard' package.") from e
+        raw = open(file_path, 'rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return open(file_path, 'r', encoding='utf-8')
+
+"""
+Returns sorted paths of all raw JSON files (plain, .gz or .zst) in folder.
+"""
+def list_raw_files(folder_path):
+    return [
+        os.path.join(folder_path, file)
+        for file in sorted(os.listdir(folder_path))
+        if file.endswith(RAW_SUFFIXES)
+    ]
+
+"""
+Yields the records of one JSON file one at a time, without reading the whole
+array into memory. The file must hold a top-level array of objects; any other
+document is loaded in full and yielded as a single record.
+"""
+def iter_json_records(file_path):
+    decoder = json.JSONDecoder()
+    with open_raw_file(file_path) as f:
+        buf = f.read(READ_BLOCK_SIZE)
+        pos = _skip_ws(buf, 0)
+        if pos >= len(buf) or buf[pos] != '[':
+            data = json.loads(buf + f.read())
+            yield from data if isinstance(data, list) else [data]
+            return
+        pos += 1
+        eof = False
+
+        while True:
+            pos = _skip_ws(buf, pos)
+            if pos < len(buf) and buf[pos] == ',':
+                pos = _skip_ws(buf, pos + 1)
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Record is split across blocks: drop what was consumed, read on
+                more = f.read(READ_BLOCK_SIZE)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            yield record
+            pos = end
+
+def _skip_ws(buf, pos):
+    while pos < len(buf) and buf[pos] in ' \t\r\n':
+        pos += 1
+    return pos
+
+"""
+Yields lists of at most chunk_size raw records from one file.
+"""
+def iter_file_batches(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    batch = []
+    for record in iter_json_records(file_path):
+        batch.append(record)
+        if len(batch) >= chunk_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+"""
+Yields normalized DataFrames of at most chunk_size rows from all files in
+folder, file by file (a chunk never spans two files).
+"""
+def iter_json_chunks(folder_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    for file_path in list_raw_files(folder_path):
+        for batch in iter_file_batches(file_path, chunk_size):
+            yield pd.json_normalize(batch)
+
 """
 Reads one JSON file and returns it as pandas DataFrame.
 """
 
 def load_json(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
+    with open_raw_file(file_path) as f:
         data = json.load(f)
     df = pd.json_normalize(data)
     return df
@@ -17,11 +115,9 @@ def load_json(file_path):
 Reads all JSON files in folder and merges to one DataFrame
 """
 def load_all_jsons(folder_path):
-    all_files = [file for file in os.listdir(folder_path) if file.endswith('.json')]
     all_dfs = []
 
-    for file in all_files:
-        file_path = os.path.join(folder_path, file)
+    for file_path in list_raw_files(folder_path):
         df = load_json(file_path)
         all_dfs.append(df)
 
@@ -31,6 +127,9 @@ def load_all_jsons(folder_path):
 if __name__ == "__main__":
 
     folder = '../data/raw'
-    df = load_all_jsons(folder)
-    print(df.head())
-    print(f"Read {len(df)} road accidents")
\ No newline at end of file
+    total = 0
+    for chunk in iter_json_chunks(folder):
+        if total == 0:
+            print(chunk.head())
+        total += len(chunk)
+    print(f"Read {total} road accidents")
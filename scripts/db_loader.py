@@ -0,0 +1,271 @@
+import io
+import os
+import time
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# PostgreSQL connection details
+PG_USER = os.getenv('PG_USER')
+PG_PASSWORD = os.getenv('PG_PASSWORD')
+PG_HOST = os.getenv('PG_HOST', 'localhost')
+PG_PORT = os.getenv('PG_PORT', '5432')
+DB_NAME = os.getenv('DB_NAME')
+
+# Rows sent per COPY round trip
+COPY_BATCH_SIZE = 100_000
+
+"""
+Column order and value kind of the events and participants tables, as
+created in sql/INIT_DB.py. The kind decides how values are validated and
+formatted for COPY.
+"""
+EVENT_COLUMNS = [
+    ('registrokodas', 'key'), ('dataLaikas', 'timestamp'), ('savivaldybe', 'text'),
+    ('ivykioVieta', 'text'), ('rusis', 'text'), ('schema1', 'text'), ('schema2', 'text'),
+    ('dangosBukle', 'text'), ('parosMetas', 'text'), ('kelioApsvietimas', 'text'),
+    ('meteoSalygos', 'text'), ('neblaivusKaltininkai', 'integer'),
+    ('apsvaigeKaltininkai', 'integer'), ('dalyviuSkaicius', 'integer'),
+    ('zuvusiuSkaicius', 'integer'), ('zuvVaiku', 'integer'), ('suzeistuSkaicius', 'integer'),
+    ('suzeistaVaiku', 'integer'), ('ilguma', 'float'), ('platuma', 'float'),
+    ('leistinasGreitis', 'float'), ('metai', 'integer'), ('menuo', 'integer'),
+    ('diena', 'integer'), ('valanda', 'integer'),
+]
+
+PARTICIPANT_COLUMNS = [
+    ('dalyvisId', 'text'), ('registrokodas', 'key'), ('kategorija', 'text'),
+    ('lytis', 'text'), ('amzius', 'integer'), ('bukle', 'text'), ('busena', 'text'),
+    ('girtumasPromilemis', 'float'), ('kaltininkas', 'boolean'), ('dalyvioBusena', 'text'),
+    ('vairavimoStazas', 'float'), ('dalyvioKetPazeidimai', 'text'),
+]
+
+INT32_MAX = 2**31 - 1
+# Cleaning fills a missing dalyvisId with this placeholder. It is stored as
+# NULL, so participants without an ID never share a natural key.
+MISSING_PARTICIPANT_ID = 'Unknown'
+_BOOLEANS = {'true': 't', 'false': 'f', 'taip': 't', 'ne': 'f', '1': 't', '0': 'f'}
+
+
+def connect():
+    return psycopg2.connect(
+        dbname=DB_NAME,
+        user=PG_USER,
+        password=PG_PASSWORD,
+        host=PG_HOST,
+        port=PG_PORT,
+        client_encoding='UTF8'
+    )
+
+"""
+Validates a frame against the table columns and formats every value the way
+COPY expects it. Returns (good, rejects): good holds only the table columns,
+rejects holds the original rows that failed with a reject_reason column.
+"""
+def prepare_frame(df, columns):
+    good = pd.DataFrame(index=df.index)
+    reason = pd.Series('', index=df.index, dtype=object)
+
+    for col, kind in columns:
+        values = df[col] if col in df else pd.Series(None, index=df.index, dtype=object)
+        present = values.notna()
+        typed = pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+
+        if kind == 'key':
+            text = values.astype(str)
+            bad = ~present | (text.str.len() == 0)
+            good[col] = text
+        elif kind == 'timestamp':
+            parsed = values if pd.api.types.is_datetime64_dtype(values) else pd.to_datetime(values, errors='coerce')
+            # dataLaikas is the partition key of events, so it is required
+            bad = parsed.isna()
+            good[col] = parsed
+        elif kind in ('integer', 'float'):
+            numbers = values if typed else pd.to_numeric(values.astype(object), errors='coerce')
+            bad = present & numbers.isna()
+            if kind == 'integer':
+                bad |= numbers.abs() > INT32_MAX
+                numbers = numbers.where(~bad).round().astype('Int64')
+            good[col] = numbers
+        elif kind == 'boolean':
+            flags = values.astype(str).str.lower().map(_BOOLEANS)
+            bad = present & flags.isna()
+            good[col] = flags
+        else:
+            good[col] = values.astype(str).where(present, None)
+            bad = pd.Series(False, index=df.index)
+
+        reason[bad & (reason == '')] = f'invalid {col}'
+
+    rejected = reason != ''
+    rejects = df[rejected].assign(reject_reason=reason[rejected])
+    return good[~rejected], rejects
+
+"""
+Streams a prepared frame into table with COPY FROM STDIN, in batches of
+COPY_BATCH_SIZE rows.
+"""
+def copy_frame(cursor, df, table):
+    copy_sql = f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    for start in range(0, len(df), COPY_BATCH_SIZE):
+        buf = io.StringIO()
+        df.iloc[start:start + COPY_BATCH_SIZE].to_csv(buf, index=False, header=False, na_rep='\\N')
+        buf.seek(0)
+        cursor.copy_expert(copy_sql, buf)
+
+"""
+Appends rejected rows to <reject_dir>/<table>_rejects.csv.
+"""
+def write_rejects(rejects, table, reject_dir):
+    if rejects.empty:
+        return None
+    os.makedirs(reject_dir, exist_ok=True)
+    path = os.path.join(reject_dir, f'{table}_rejects.csv')
+    rejects.to_csv(path, mode='a', header=not os.path.exists(path), index=False, encoding='utf-8')
+    return path
+
+"""
+Adds row_hash, a 64-bit hash of each prepared event row, so the merge can skip
+events whose content has not changed.
+"""
+def add_row_hash(events):
+    hashes = pd.util.hash_pandas_object(events, index=False)
+    return events.assign(row_hash=hashes.values.view('int64'))
+
+def _event_merge_sql():
+    columns = [col for col, _ in EVENT_COLUMNS] + ['row_hash']
+    updates = ', '.join(f'{col} = EXCLUDED.{col}' for col in columns[1:])
+    return f"""
+        INSERT INTO events ({', '.join(columns)})
+        SELECT {', '.join(columns)} FROM events_staging
+        ON CONFLICT (registrokodas, dataLaikas) DO UPDATE SET {updates}
+        WHERE events.row_hash IS DISTINCT FROM EXCLUDED.row_hash;
+    """
+
+# The primary key includes the partition key, so an event whose dataLaikas
+# was corrected must be removed from its old partition before the upsert
+MOVED_EVENTS_SQL = """
+    DELETE FROM events e USING events_staging s
+    WHERE e.registrokodas = s.registrokodas AND e.dataLaikas <> s.dataLaikas;
+"""
+
+"""
+Participants with their placeholder dalyvisId replaced by None.
+"""
+def without_placeholder_ids(participants_df):
+    ids = participants_df['dalyvisId']
+    return participants_df.assign(dalyvisId=ids.where(ids != MISSING_PARTICIPANT_ID, None))
+
+# Participants without an ID have no natural key to upsert by: those of every
+# event being loaded are replaced as a whole
+ANONYMOUS_PARTICIPANTS_SQL = """
+    DELETE FROM participants p USING events_staging s
+    WHERE p.registrokodas = s.registrokodas AND p.dalyvisId IS NULL;
+"""
+
+def _participant_merge_sql():
+    columns = [col for col, _ in PARTICIPANT_COLUMNS]
+    values = [col for col in columns if col not in ('registrokodas', 'dalyvisId')]
+    return f"""
+        INSERT INTO participants ({', '.join(columns)})
+        SELECT {', '.join('s.' + col for col in columns)}
+        FROM participants_staging s
+        JOIN events e ON e.registrokodas = s.registrokodas
+        ON CONFLICT (registrokodas, dalyvisId) DO UPDATE
+        SET {', '.join(f'{col} = EXCLUDED.{col}' for col in values)}
+        WHERE ({', '.join('participants.' + col for col in values)})
+              IS DISTINCT FROM ({', '.join('EXCLUDED.' + col for col in values)});
+    """
+
+"""
+Loads events and participants: rows are validated, streamed into temporary
+staging tables with COPY and upserted into events/participants in a single
+transaction. Rows that fail validation are written to reject files instead
+of aborting the batch. Participants are matched to events on the server, so
+no keys are pulled back into Python.
+
+Re-running is idempotent: events are only rewritten when their row_hash
+changed and participants are upserted by (registrokodas, dalyvisId), so
+unchanged rows of a re-sent file cost no writes. Participants without a
+dalyvisId are stored with a NULL one and rewritten with their event's file.
+"""
+def sync_to_db(events_df, participants_df, reject_dir):
+    start = time.perf_counter()
+    events, event_rejects = prepare_frame(events_df, EVENT_COLUMNS)
+    events = add_row_hash(events.drop_duplicates(subset='registrokodas'))
+    participants, participant_rejects = prepare_frame(without_placeholder_ids(participants_df), PARTICIPANT_COLUMNS)
+    anonymous = participants['dalyvisId'].isna()
+    participants = pd.concat([
+        participants[~anonymous].drop_duplicates(subset=['registrokodas', 'dalyvisId'], keep='last'),
+        participants[anonymous],
+    ])
+
+    for rejects, table in ((event_rejects, 'events'), (participant_rejects, 'participants')):
+        path = write_rejects(rejects, table, reject_dir)
+        if path:
+            print(f"Rejected {len(rejects)} {table} rows, see {path}")
+
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TEMP TABLE events_staging (LIKE events INCLUDING DEFAULTS) ON COMMIT DROP;
+                CREATE TEMP TABLE participants_staging ON COMMIT DROP AS
+                    SELECT * FROM participants WITH NO DATA;
+                ALTER TABLE participants_staging DROP COLUMN id;
+            """)
+            copy_frame(cursor, events, 'events_staging')
+            cursor.execute(MOVED_EVENTS_SQL)
+            cursor.execute(_event_merge_sql())
+            print(f"Events inserted or changed: {cursor.rowcount} out of {len(events)}, "
+                  f"rejected: {len(event_rejects)}")
+
+            copy_frame(cursor, participants, 'participants_staging')
+            cursor.execute(ANONYMOUS_PARTICIPANTS_SQL)
+            cursor.execute(_participant_merge_sql())
+            print(f"Participants inserted or changed: {cursor.rowcount} out of {len(participants)}, "
+                  f"rejected: {len(participant_rejects)}")
+        conn.commit()
+
+    elapsed = time.perf_counter() - start
+    rows = len(events) + len(participants)
+    print(f"Bulk load: {rows} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+"""
+Refreshes the materialized summary tables created in sql/INIT_DB.py. Called
+once after every load; CONCURRENTLY keeps them readable meanwhile.
+"""
+def refresh_aggregates():
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            for view in ('daily_municipality_counts', 'yearly_fatality_counts'):
+                cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view};")
+        conn.commit()
+
+"""
+Daily accident counts per municipality from the summary table, in the shape
+scripts/model.py aggregates them: ['savivaldybe', 'date', 'accident_count'].
+"""
+def read_daily_counts():
+    with connect() as conn:
+        return pd.read_sql(
+            "SELECT savivaldybe, data AS date, ivykiuSkaicius AS accident_count "
+            "FROM daily_municipality_counts ORDER BY savivaldybe, data;",
+            conn, parse_dates=['date']
+        )
+
+"""
+Yearly fatality counts from the summary table: ['metai', 'Death count'].
+"""
+def read_yearly_fatalities():
+    with connect() as conn:
+        return pd.read_sql(
+            'SELECT metai, zuvusiuSkaicius AS "Death count" FROM yearly_fatality_counts ORDER BY metai;',
+            conn
+        )
+
+"""
+Bulk loads all given rows.
+"""
+def bulk_save_to_db(events_df, participants_df, reject_dir):
+    return sync_to_db(events_df, participants_df, reject_dir)
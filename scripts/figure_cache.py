@@ -0,0 +1,52 @@
+import threading
+import plotly.offline as pyo
+
+
+class FigureCache:
+    """
+    Plotly figures, their rendered HTML divs and JSON, keyed by chart id and data
+    version, so a page only builds and serializes a figure once per data
+    version. Divs are kept with and without the plotly.js <script> tag, since
+    only the first chart on a page includes it.
+    """
+
+    def __init__(self):
+        self._figures = {}
+        self._divs = {}
+        self._jsons = {}
+        self._lock = threading.Lock()
+
+    def figure(self, chart_id: str, version: str, build):
+        key = (chart_id, version)
+        fig = self._figures.get(key)
+        if fig is None:
+            fig = build()
+            with self._lock:
+                fig = self._figures.setdefault(key, fig)
+        return fig
+
+    def div(self, chart_id: str, version: str, build, include_plotlyjs: bool = False) -> str:
+        key = (chart_id, version, include_plotlyjs)
+        div = self._divs.get(key)
+        if div is None:
+            fig = self.figure(chart_id, version, build)
+            div = pyo.plot(fig, include_plotlyjs='cdn' if include_plotlyjs else False, output_type='div')
+            with self._lock:
+                div = self._divs.setdefault(key, div)
+        return div
+
+    def json(self, chart_id: str, version: str, build) -> str:
+        key = (chart_id, version)
+        text = self._jsons.get(key)
+        if text is None:
+            text = self.figure(chart_id, version, build).to_json()
+            with self._lock:
+                text = self._jsons.setdefault(key, text)
+        return text
+
+    def purge(self, version: str):
+        """Drops figures of every other data version."""
+        with self._lock:
+            self._figures = {k: v for k, v in self._figures.items() if k[1] == version}
+            self._divs = {k: v for k, v in self._divs.items() if k[1] == version}
+            self._jsons = {k: v for k, v in self._jsons.items() if k[1] == version}
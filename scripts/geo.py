@@ -0,0 +1,27 @@
+from functools import lru_cache
+import numpy as np
+from pyproj import Transformer
+
+# Coordinates of the raw data are LKS92 / Lithuania TM; the map needs WGS84
+SOURCE_CRS = 'epsg:3346'
+TARGET_CRS = 'epsg:4326'
+
+
+@lru_cache(maxsize=1)
+def _transformer() -> Transformer:
+    # building a transformer costs more than projecting a chunk, so one per process
+    return Transformer.from_crs(SOURCE_CRS, TARGET_CRS, always_xy=True)
+
+"""
+Converts the raw platuma/ilguma columns (LKS92 easting/northing, in that
+order) to WGS84 (lat, lon) arrays. Missing coordinates, which cleaning fills
+with 0, become NaN.
+"""
+def to_wgs84(platuma, ilguma):
+    x = np.asarray(platuma, dtype=np.float64)
+    y = np.asarray(ilguma, dtype=np.float64)
+    lon, lat = _transformer().transform(x, y)
+    missing = ((x == 0) & (y == 0)) | np.isnan(x) | np.isnan(y)
+    lat = np.where(missing, np.nan, lat)
+    lon = np.where(missing, np.nan, lon)
+    return lat, lon
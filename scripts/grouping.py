@@ -1,4 +1,5 @@
 import pandas as pd
+from scripts.processed_store import read_events, read_participants
 
 """
 Grouping: Events data:
@@ -6,19 +7,19 @@ Grouping: Events data:
 
 # Groups the number of traffic accidents by year.
 def group_by_year(events_df):
-    return events_df.groupby('metai').size().reset_index(name='accident_number').sort_values(by='accident_number', ascending=False)
+    return events_df.groupby('metai', observed=True).size().reset_index(name='accident_number').sort_values(by='accident_number', ascending=False)
 
 # Groups the number of traffic accidents by municipality.
 def group_by_municipality(events_df):
-    return events_df.groupby('savivaldybe').size().reset_index(name='accident_number').sort_values(by='accident_number', ascending=False)
+    return events_df.groupby('savivaldybe', observed=True).size().reset_index(name='accident_number').sort_values(by='accident_number', ascending=False)
 
 # Groups the number of traffic accidents by type of accident.
 def group_by_event_type(events_df):
-    return events_df.groupby('rusis').size().reset_index(name='accident_number').sort_values(by='accident_number', ascending=False)
+    return events_df.groupby('rusis', observed=True).size().reset_index(name='accident_number').sort_values(by='accident_number', ascending=False)
 
 # Groups the number of traffic accidents by road surface condition.
 def group_by_road_surface(events_df):
-    return events_df.groupby('dangosBukle').size().reset_index(name='accident_number').sort_values(by='accident_number', ascending=False)
+    return events_df.groupby('dangosBukle', observed=True).size().reset_index(name='accident_number').sort_values(by='accident_number', ascending=False)
 
 """
 Grouping: Participants data:
@@ -26,27 +27,27 @@ Grouping: Participants data:
 
 # Groups participants by age.
 def group_participants_by_age(participants_df):
-    return participants_df.groupby('amzius').size().reset_index(
+    return participants_df.groupby('amzius', observed=True).size().reset_index(
         name='number_of_participants').sort_values(by='number_of_participants', ascending=False)
 
 # Groups participants by gender.
 def group_participants_by_gender(participants_df):
-    return participants_df.groupby('lytis').size().reset_index(
+    return participants_df.groupby('lytis', observed=True).size().reset_index(
         name='number_of_participants').sort_values(by='number_of_participants', ascending=False)
 
 # Groups participants according to their legal status in the event (e.g., perpetrator, non-violator)
 def group_participants_by_status(participants_df):
-    return participants_df.groupby('dalyvioBusena').size().reset_index(
+    return participants_df.groupby('dalyvioBusena', observed=True).size().reset_index(
         name='number_of_participants').sort_values(by='number_of_participants', ascending=False)
 
 # Groups participants according to their condition (e.g., injured, uninjured).
 def group_participants_by_condition(participants_df):
-    return participants_df.groupby('bukle').size().reset_index(
+    return participants_df.groupby('bukle', observed=True).size().reset_index(
         name='number_of_participants').sort_values(by='number_of_participants', ascending=False)
 
 # Groups participants according to driving experience.
 def group_participants_by_experience(participants_df):
-    return participants_df.groupby('vairavimoStazas').size().reset_index(
+    return participants_df.groupby('vairavimoStazas', observed=True).size().reset_index(
         name='number_of_participants').sort_values(by='number_of_participants', ascending=False)
 
 """
@@ -77,9 +78,9 @@ def main():
     Handles loading data, displaying the menu, and executing selected options.
     """
     try:
-        # Attempting to read the CSV files containing events and participants data
-        events_df = pd.read_csv('../data/processed/cleaned_events.csv', low_memory=False)
-        participants_df = pd.read_csv('../data/processed/cleaned_participants.csv', low_memory=False)
+        # Attempting to read the events and participants data from the processed store
+        events_df = read_events()
+        participants_df = read_participants()
     except FileNotFoundError as e:
         # Handling the error if the files are not found
         print(f"File not found: {e}")
@@ -0,0 +1,74 @@
+import gzip
+import hashlib
+import json
+import os
+from flask import Response, make_response
+
+try:
+    import brotli
+except ImportError:  # listed in requirements.txt; without it responses are only gzip-compressed
+    brotli = None
+
+"""
+Conditional GET for the JSON endpoints and compression of text responses.
+
+A response's ETag is a hash of the versions of the data (and model) it is
+computed from plus the request parameters, so it is known before any work
+is done: conditional() answers a matching If-None-Match with an empty 304
+without building the payload. ETags are weak, since the same payload may
+be sent gzip- or brotli-compressed. compress() (an after_request hook)
+compresses text responses of at least COMPRESS_MIN_SIZE bytes.
+"""
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+COMPRESSIBLE = ('text/', 'application/json', 'application/geo+json', 'application/javascript')
+# Clients revalidate every time (a new ingest changes the data at any moment)
+CACHE_CONTROL = 'no-cache'
+
+
+"""Short hash of the JSON-serializable parts (versions, parameters) a response depends on."""
+def etag_for(*parts) -> str:
+    text = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:20]
+
+"""
+Response for a GET with this ETag: 304 if the client already has it,
+otherwise build() (anything a view may return). Only 200 responses carry
+the ETag, so errors are never answered with 304.
+"""
+def conditional(request, etag: str, build):
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+def _encoding(accept_encoding) -> str:
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+def compress(request, response):
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or not response.mimetype.startswith(COMPRESSIBLE)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _encoding(request.accept_encodings)
+    data = response.get_data() if encoding else b''
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    if encoding == 'br':
+        data = brotli.compress(data, quality=min(COMPRESS_LEVEL, 11))
+    else:
+        data = gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
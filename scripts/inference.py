@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import subprocess
+import numpy as np
+
+
+"""
+TensorFlow-free inference for the LSTM built by scripts/model.py
+(build_lstm_model): Embedding(mun) + LSTM(seq) -> Concatenate -> Dense(relu)
+-> Dense(1). export_weights() writes the trained weights to an .npz file and
+LSTMForecaster runs the same forward pass in NumPy, so the web app does not
+need to import TensorFlow.
+
+Usage (from the project root):
+    python -m scripts.inference export [model.keras] [weights.npz]
+    python -m scripts.inference check [model.keras] [weights.npz]
+"""
+
+BASEDIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MODEL_PATH = os.path.join(BASEDIR, 'models', 'lstm_accident_model_final.keras')
+WEIGHTS_PATH = os.path.join(BASEDIR, 'models', 'lstm_accident_model_final.npz')
+
+# Largest allowed |NumPy - Keras| difference in the parity check
+PARITY_TOLERANCE = 1e-4
+
+
+def _layers(model, kind):
+    return [layer for layer in model.layers if layer.__class__.__name__ == kind]
+
+
+def export_weights(model, path: str = WEIGHTS_PATH):
+    """
+    Saves the weights of a build_lstm_model() model as float32 arrays. Keras
+    stores the LSTM gates in the order input, forget, cell, output.
+    """
+    (embedding,) = _layers(model, 'Embedding')
+    (lstm,) = _layers(model, 'LSTM')
+    hidden, output = _layers(model, 'Dense')
+    if lstm.get_config()['recurrent_activation'] != 'sigmoid' or lstm.get_config()['activation'] != 'tanh':
+        raise ValueError('Only the default LSTM activations (tanh / sigmoid) are supported.')
+
+    kernel, recurrent, bias = lstm.get_weights()
+    arrays = {
+        'embedding': embedding.get_weights()[0],
+        'lstm_kernel': kernel, 'lstm_recurrent': recurrent, 'lstm_bias': bias,
+        'dense_kernel': hidden.get_weights()[0], 'dense_bias': hidden.get_weights()[1],
+        'out_kernel': output.get_weights()[0], 'out_bias': output.get_weights()[1],
+    }
+    np.savez(path, **{name: np.asarray(a, dtype=np.float32) for name, a in arrays.items()})
+    return path
+
+
+def _sigmoid(x):
+    # tanh form: exact and without overflow for large |x|
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+class LSTMForecaster:
+    """
+    NumPy forward pass over exported weights. predict() takes the same
+    inputs as the Keras model, seqs (N, seq_len, 1) and muns (N,), and
+    returns (N, 1) float32 predictions for the whole batch at once.
+    """
+
+    def __init__(self, weights: dict):
+        self.embedding = weights['embedding']
+        self.lstm_kernel = weights['lstm_kernel']
+        self.lstm_recurrent = weights['lstm_recurrent']
+        self.lstm_bias = weights['lstm_bias']
+        self.dense_kernel = weights['dense_kernel']
+        self.dense_bias = weights['dense_bias']
+        self.out_kernel = weights['out_kernel']
+        self.out_bias = weights['out_bias']
+        self.units = self.lstm_recurrent.shape[0]
+
+    @classmethod
+    def load(cls, path: str = WEIGHTS_PATH) -> 'LSTMForecaster':
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def predict(self, seqs: np.ndarray, muns: np.ndarray) -> np.ndarray:
+        x = np.asarray(seqs, dtype=np.float32)
+        x = x.reshape(x.shape[0], x.shape[1], -1)
+        n, u = x.shape[0], self.units
+
+        # input projections of all time steps in one matmul: (N, seq_len, 4u)
+        xz = x @ self.lstm_kernel + self.lstm_bias
+        h = np.zeros((n, u), dtype=np.float32)
+        c = np.zeros((n, u), dtype=np.float32)
+        for t in range(x.shape[1]):
+            z = xz[:, t] + h @ self.lstm_recurrent
+            i = _sigmoid(z[:, :u])
+            f = _sigmoid(z[:, u:2 * u])
+            g = np.tanh(z[:, 2 * u:3 * u])
+            o = _sigmoid(z[:, 3 * u:])
+            c = f * c + i * g
+            h = o * np.tanh(c)
+
+        emb = self.embedding[np.asarray(muns, dtype=np.int64).reshape(-1)]
+        d = np.maximum(np.concatenate([h, emb], axis=1) @ self.dense_kernel + self.dense_bias, 0)
+        return d @ self.out_kernel + self.out_bias
+
+
+def _peak_rss_mb(code: str) -> float:
+    """Peak RSS of a fresh interpreter running code (imports + model load)."""
+    # VmHWM, unlike ru_maxrss, is not inherited from the (TensorFlow-loaded) parent across exec
+    probe = code + "\nprint([l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')][0])"
+    out = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True,
+                         env={**os.environ, 'TF_CPP_MIN_LOG_LEVEL': '3'}, cwd=BASEDIR)
+    return int(out.stdout.strip().splitlines()[-1]) / 1024
+
+
+def check(model_path: str = MODEL_PATH, weights_path: str = WEIGHTS_PATH, batch_sizes=(1, 60, 1024)):
+    """
+    Parity of LSTMForecaster against the Keras model on random inputs, plus
+    per-call latency and the peak RSS of a process serving each of them.
+    """
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path)
+    engine = LSTMForecaster.load(weights_path)
+    seq_len = model.inputs[0].shape[1]
+    n_muns = engine.embedding.shape[0]
+    rng = np.random.default_rng(0)
+
+    print(f"{'batch':>6}{'max |diff|':>12}{'keras ms':>10}{'numpy ms':>10}")
+    for n in batch_sizes:
+        seqs = rng.poisson(1.5, size=(n, seq_len, 1)).astype(np.float32)
+        muns = rng.integers(0, n_muns, size=n).astype(np.int32)
+        expected = model.predict([seqs, muns], verbose=0)
+        diff = np.abs(engine.predict(seqs, muns) - expected).max()
+        if diff > PARITY_TOLERANCE:
+            raise AssertionError(f'NumPy output differs from Keras by {diff:.2e} (batch {n})')
+
+        timings = {}
+        for label, func in (('keras', lambda: model([seqs, muns], training=False)),
+                            ('numpy', lambda: engine.predict(seqs, muns))):
+            func()
+            start = time.perf_counter()
+            for _ in range(20):
+                func()
+            timings[label] = (time.perf_counter() - start) / 20 * 1000
+        print(f"{n:>6}{diff:>12.2e}{timings['keras']:>10.2f}{timings['numpy']:>10.2f}")
+
+    keras_rss = _peak_rss_mb(f"import tensorflow as tf; tf.keras.models.load_model({model_path!r})")
+    numpy_rss = _peak_rss_mb(f"from scripts.inference import LSTMForecaster; LSTMForecaster.load({weights_path!r})")
+    print(f"\nPeak RSS after import + load: keras {keras_rss:.0f} MB, numpy {numpy_rss:.0f} MB")
+
+
+if __name__ == '__main__':
+    command, *paths = sys.argv[1:] or ['check']
+    if command == 'export':
+        import tensorflow as tf
+        model_path = paths[0] if paths else MODEL_PATH
+        print(f"Weights saved to {export_weights(tf.keras.models.load_model(model_path), *paths[1:2])}")
+    elif command == 'check':
+        check(*paths)
+    else:
+        raise SystemExit(f"Unknown command {command!r}, expected 'export' or 'check'")
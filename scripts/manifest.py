@@ -0,0 +1,74 @@
+import os
+import json
+import hashlib
+
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+"""
+Returns the SHA-256 hex digest of a file's content.
+"""
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+"""
+Reads the manifest of processed raw files. Returns an empty manifest if the
+file does not exist yet.
+"""
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+"""
+Writes the manifest atomically so an interrupted run never leaves it half written.
+"""
+def save_manifest(manifest, manifest_path):
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+"""
+Builds the manifest entry (size, mtime, content hash) for one raw file.
+"""
+def file_entry(file_path, known_hash=None):
+    stat = os.stat(file_path)
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'sha256': known_hash or file_hash(file_path),
+    }
+
+"""
+Compares raw files against the manifest.
+
+Returns (pending, removed): pending maps file name -> fresh manifest entry for
+every new or changed file; removed lists names in the manifest whose file is
+gone. Files whose size and mtime are unchanged are not re-hashed; files that
+were only touched get their mtime refreshed in the manifest.
+"""
+def diff_manifest(manifest, file_paths):
+    pending = {}
+    seen = set()
+    for file_path in file_paths:
+        name = os.path.basename(file_path)
+        seen.add(name)
+        old = manifest.get(name)
+        stat = os.stat(file_path)
+        if old and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime:
+            continue
+        entry = file_entry(file_path)
+        if old and old['sha256'] == entry['sha256']:
+            old['mtime'] = entry['mtime']
+            continue
+        pending[name] = entry
+    removed = [name for name in manifest if name not in seen]
+    return pending, removed
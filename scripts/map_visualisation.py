@@ -1,23 +1,264 @@
+import os
+import json
+import numpy as np
 import pandas as pd
-from pyproj import Transformer
+from scripts.geo import to_wgs84
+from scripts.shared_arrays import pack, unpack
+from scripts.processed_store import read_events
 import plotly.express as px
 import plotly.offline as pyo
 
-def load_map_data(path: str) -> pd.DataFrame:
+MAP_COLUMNS = ['savivaldybe', 'dataLaikas', 'rusis', 'metai', 'lat', 'lon']
+
+# Zoom of the /map page figure
+MAP_ZOOM = 6
+# Grid cell size (km) used up to each zoom level; beyond the last one, points
+GRID_LEVELS = ((7, 8.0), (9, 2.0), (11, 0.5))
+# Filters matching at most this many events are drawn as individual points
+MAP_POINT_LIMIT = int(os.getenv('MAP_POINT_LIMIT', 5000))
+# Most features one viewport query (/api/map) returns
+MAP_FEATURE_LIMIT = int(os.getenv('MAP_FEATURE_LIMIT', 20000))
+KM_PER_DEGREE = 111.32
+# GeoJSON coordinates are rounded to about a metre
+COORD_DECIMALS = 5
+
+
+class MapStore:
     """
-    Reads cleaned_events.csv, filters years, converts coords to WGS84,
-    and returns a DataFrame with latitude/longitude.
+    Map points of every event kept in memory, sorted by (rusis, metai), with
+    the row positions of every category, year and (category, year) pair
+    computed once. A filtered map is then a take() of precomputed positions
+    instead of reading and reprojecting the store on each request.
+
+    For every filter and every GRID_LEVELS cell size, event counts per grid
+    cell are computed up front as well, so a wide filter can be drawn as a
+    few thousand cells instead of hundreds of thousands of points.
+
+    Cells and, per filter, points ordered by their finest grid cell form a
+    grid-bucket spatial index: the cells of one grid row inside a bounding
+    box are one contiguous range, so viewport() finds the events in view
+    with two binary searches per row, at a cost that follows the number of
+    results rather than the size of the data.
     """
-    df = pd.read_csv(path, parse_dates=['dataLaikas'])
-    # optional year filtering
-    df = df[(df['metai'] >= 2013) & (df['metai'] <= 2023)]
-    # convert from LKS92 (EPSG:3346) → WGS84
-    transformer = Transformer.from_crs('epsg:3346', 'epsg:4326', always_xy=True)
-    df['lon'], df['lat'] = transformer.transform(
-        df['platuma'].values,
-        df['ilguma'].values
-    )
-    return df
+
+    def __init__(self, df: pd.DataFrame):
+        df = df.dropna(subset=['lat', 'lon'])
+        df = df.sort_values(['rusis', 'metai'], kind='stable').reset_index(drop=True)
+        self.df = df
+        rusis = df['rusis'].astype(str).to_numpy()
+        metai = df['metai'].to_numpy()
+        self._index = {(None, None): np.arange(len(df))}
+        for key, idx in df.groupby([rusis, metai], sort=False).indices.items():
+            self._index[(key[0], int(key[1]))] = idx
+        for cat, idx in df.groupby(rusis, sort=False).indices.items():
+            self._index[(cat, None)] = idx
+        for year, idx in df.groupby(metai, sort=False).indices.items():
+            self._index[(None, int(year))] = idx
+        self.categories = sorted({k[0] for k in self._index if k[0] is not None})
+        self.years = sorted({k[1] for k in self._index if k[1] is not None})
+
+        lat, lon = df['lat'].to_numpy(), df['lon'].to_numpy()
+        self._origin = (lat.min(), lon.min()) if len(df) else (0.0, 0.0)
+        self._mid_lat = (lat.min() + lat.max()) / 2 if len(df) else 0.0
+        self._levels = {}
+        self._grids = {}
+        self._grid_ids = {}
+        self._points = {}
+        for _, cell_km in GRID_LEVELS:
+            dlat, dlon = self._cell_degrees(cell_km)
+            row = ((lat - self._origin[0]) // dlat).astype(np.int64)
+            col = ((lon - self._origin[1]) // dlon).astype(np.int64)
+            nrows, ncols = (row.max() + 1, col.max() + 1) if len(df) else (1, 1)
+            self._levels[cell_km] = (dlat, dlon, nrows, ncols)
+            cells = row * ncols + col
+            for key, idx in self._index.items():
+                ids, counts = np.unique(cells[idx], return_counts=True)
+                self._grid_ids[(key, cell_km)] = ids
+                self._grids[(key, cell_km)] = pd.DataFrame({
+                    'lat': (self._origin[0] + (ids // ncols + 0.5) * dlat).astype(np.float32),
+                    'lon': (self._origin[1] + (ids % ncols + 0.5) * dlon).astype(np.float32),
+                    'count': counts.astype(np.int32),
+                })
+        # point buckets: the finest cells
+        self._bucket_km = cell_km
+        for key, idx in self._index.items():
+            order = idx[np.argsort(cells[idx], kind='stable')].astype(np.int32)
+            self._points[key] = (order, cells[order])
+
+    def _cell_degrees(self, cell_km: float):
+        # square cells at the latitude of the data (lon degrees are shorter)
+        return cell_km / KM_PER_DEGREE, cell_km / (KM_PER_DEGREE * np.cos(np.radians(self._mid_lat)))
+
+    def to_arrays(self):
+        """Columns and indexes as flat arrays plus JSON meta, for shared_arrays.publish()."""
+        arrays, meta = {}, {'columns': list(self.df.columns), 'categoricals': {}}
+        for col in self.df.columns:
+            values = self.df[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                arrays[f'col_{col}'] = values.cat.codes.to_numpy()
+                arrays[f'categories_{col}'] = values.cat.categories.to_numpy().astype(str)
+                meta['categoricals'][col] = True
+            else:
+                arrays[f'col_{col}'] = values.to_numpy()
+        keys, arrays['index'], arrays['index_offsets'] = pack(self._index, np.int32)
+        meta['index_keys'] = keys
+        keys, arrays['grid_ids'], arrays['grid_offsets'] = pack(self._grid_ids, np.int64)
+        meta['grid_keys'] = [[k[0], k[1], km] for k, km in keys]
+        for col in ('lat', 'lon', 'count'):
+            arrays[f'grid_{col}'] = np.concatenate([self._grids[k][col].to_numpy() for k in keys])
+        keys, arrays['point_order'], _ = pack({k: v[0] for k, v in self._points.items()}, np.int32)
+        _, arrays['point_ids'], arrays['point_offsets'] = pack({k: v[1] for k, v in self._points.items()}, np.int64)
+        meta['point_keys'] = keys
+        meta['levels'] = [[km, *level] for km, level in self._levels.items()]
+        meta.update(origin=list(self._origin), mid_lat=self._mid_lat, bucket_km=self._bucket_km,
+                    categories=self.categories, years=self.years)
+        return arrays, json.loads(json.dumps(meta, default=lambda v: v.item()))
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, meta: dict) -> 'MapStore':
+        """A MapStore over (possibly memory-mapped) arrays of to_arrays(), without copying them."""
+        store = cls.__new__(cls)
+        columns = {}
+        for col in meta['columns']:
+            values = arrays[f'col_{col}']
+            if col in meta['categoricals']:
+                values = pd.Categorical.from_codes(values, categories=arrays[f'categories_{col}'].tolist(),
+                                                   validate=False)
+            columns[col] = values
+        store.df = pd.DataFrame(columns, copy=False)
+        as_key = lambda k: (k[0], k[1])
+        store._index = unpack([as_key(k) for k in meta['index_keys']], arrays['index'], arrays['index_offsets'])
+        grid_keys = [(as_key(k), k[2]) for k in meta['grid_keys']]
+        store._grid_ids = unpack(grid_keys, arrays['grid_ids'], arrays['grid_offsets'])
+        grid_cols = {col: unpack(grid_keys, arrays[f'grid_{col}'], arrays['grid_offsets'])
+                     for col in ('lat', 'lon', 'count')}
+        store._grids = {key: pd.DataFrame({col: grid_cols[col][key] for col in grid_cols}, copy=False)
+                        for key in grid_keys}
+        point_keys = [as_key(k) for k in meta['point_keys']]
+        orders = unpack(point_keys, arrays['point_order'], arrays['point_offsets'])
+        ids = unpack(point_keys, arrays['point_ids'], arrays['point_offsets'])
+        store._points = {key: (orders[key], ids[key]) for key in point_keys}
+        store._levels = {level[0]: tuple(level[1:]) for level in meta['levels']}
+        store._origin = tuple(meta['origin'])
+        store._mid_lat = meta['mid_lat']
+        store._bucket_km = meta['bucket_km']
+        store.categories = meta['categories']
+        store.years = meta['years']
+        return store
+
+    @classmethod
+    def from_store(cls, store_dir: str) -> 'MapStore':
+        df = read_events(columns=MAP_COLUMNS + ['ilguma', 'platuma'], store_dir=store_dir)
+        # parts written before lat/lon were stored are projected here
+        stale = df['lat'].isna() & df['lon'].isna()
+        if stale.any():
+            df.loc[stale, 'lat'], df.loc[stale, 'lon'] = to_wgs84(
+                df.loc[stale, 'platuma'], df.loc[stale, 'ilguma'])
+        return cls(df[MAP_COLUMNS])
+
+    def count(self, category: str = None, year: int = None) -> int:
+        idx = self._index.get((category or None, int(year) if year else None))
+        return 0 if idx is None else len(idx)
+
+    def query(self, category: str = None, year: int = None) -> pd.DataFrame:
+        idx = self._index.get((category or None, int(year) if year else None))
+        if idx is None:
+            return self.df.iloc[:0]
+        return self.df.take(idx)
+
+    @staticmethod
+    def cell_km(zoom: float):
+        """Grid cell size for a zoom level, None where points should be drawn."""
+        for max_zoom, cell_km in GRID_LEVELS:
+            if zoom <= max_zoom:
+                return cell_km
+        return None
+
+    def grid(self, category: str = None, year: int = None, cell_km: float = GRID_LEVELS[0][1]) -> pd.DataFrame:
+        """Cell centres (lat, lon) and event counts of a filter at one GRID_LEVELS cell size."""
+        cells = self._grids.get(((category or None, int(year) if year else None), cell_km))
+        if cells is None:
+            return pd.DataFrame({'lat': [], 'lon': [], 'count': []})
+        return cells
+
+    def _in_bbox(self, ids: np.ndarray, cell_km: float, bbox) -> np.ndarray:
+        # positions in the sorted cell ids whose cell intersects bbox
+        min_lon, min_lat, max_lon, max_lat = bbox
+        dlat, dlon, nrows, ncols = self._levels[cell_km]
+        r0, r1 = int((min_lat - self._origin[0]) // dlat), int((max_lat - self._origin[0]) // dlat)
+        c0, c1 = int((min_lon - self._origin[1]) // dlon), int((max_lon - self._origin[1]) // dlon)
+        r0, r1, c0, c1 = max(r0, 0), min(r1, nrows - 1), max(c0, 0), min(c1, ncols - 1)
+        if r0 > r1 or c0 > c1:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(r0, r1 + 1) * ncols
+        starts = np.searchsorted(ids, rows + c0, side='left')
+        ends = np.searchsorted(ids, rows + c1, side='right')
+        return np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+
+    def viewport(self, bbox, zoom: float, category: str = None, year: int = None):
+        """
+        Events of a filter inside bbox (min_lon, min_lat, max_lon, max_lat)
+        as (cell_km, frame): grid cell counts at the cell size of the zoom
+        level, or (None, points) once the zoom is past the grid levels.
+        Raises ValueError for a non-finite bbox or zoom, or an inverted bbox.
+        """
+        if not np.isfinite(list(bbox) + [zoom]).all():
+            raise ValueError('bbox and zoom must be finite numbers')
+        if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            raise ValueError('bbox minimum is greater than its maximum')
+        key = (category or None, int(year) if year else None)
+        cell_km = self.cell_km(zoom)
+        if key not in self._index:
+            return cell_km, self.df.iloc[:0] if cell_km is None else self.grid(cell_km=cell_km).iloc[:0]
+        if cell_km is not None:
+            pos = self._in_bbox(self._grid_ids[(key, cell_km)], cell_km, bbox)
+            return cell_km, self._grids[(key, cell_km)].take(pos)
+        order, ids = self._points[key]
+        points = self.df.take(order[self._in_bbox(ids, self._bucket_km, bbox)])
+        min_lon, min_lat, max_lon, max_lat = bbox
+        inside = points['lat'].between(min_lat, max_lat) & points['lon'].between(min_lon, max_lon)
+        return None, points[inside]
+
+
+def viewport_geojson(store: MapStore, bbox, zoom: float, category: str = None, year: int = None,
+                     limit: int = MAP_FEATURE_LIMIT) -> dict:
+    """
+    Compact GeoJSON FeatureCollection of MapStore.viewport(): Point features
+    with a count per grid cell, or with rusis/metai/savivaldybe/data per
+    event. At most limit features are returned ("truncated" tells if more
+    matched); "cell_km" is null for events.
+    """
+    cell_km, frame = store.viewport(bbox, zoom, category, year)
+    truncated = len(frame) > limit
+    frame = frame.iloc[:limit]
+    coords = zip(frame['lon'].to_numpy(np.float64).round(COORD_DECIMALS).tolist(),
+                 frame['lat'].to_numpy(np.float64).round(COORD_DECIMALS).tolist())
+    if cell_km is not None:
+        props = ({'count': c} for c in frame['count'].tolist())
+    else:
+        props = (
+            {'rusis': r, 'metai': m, 'savivaldybe': s, 'data': d}
+            for r, m, s, d in zip(frame['rusis'].astype(str).tolist(), frame['metai'].tolist(),
+                                  frame['savivaldybe'].astype(str).tolist(),
+                                  frame['dataLaikas'].dt.strftime('%Y-%m-%d %H:%M').tolist())
+        )
+    return {
+        'type': 'FeatureCollection',
+        'cell_km': cell_km,
+        'truncated': truncated,
+        'features': [
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': list(xy)}, 'properties': p}
+            for xy, p in zip(coords, props)
+        ],
+    }
+
+def load_map_data(store_dir: str, year: int = None) -> pd.DataFrame:
+    """
+    Reads the map columns from the processed store (only the requested year,
+    if given); latitude/longitude were projected to WGS84 at ingest.
+    """
+    years = [year] if year else range(2013, 2024)
+    return read_events(columns=MAP_COLUMNS, years=years, store_dir=store_dir).dropna(subset=['lat', 'lon'])
 
 def make_scatter_map(
     df: pd.DataFrame,
@@ -27,7 +268,7 @@ def make_scatter_map(
     """
     Builds a Plotly scatter_mapbox figure, optionally filtered by rusis/year.
     """
-    d = df.copy()
+    d = df
     if category:
         d = d[d['rusis'] == category]
     if year:
@@ -48,14 +289,41 @@ def make_scatter_map(
     )
     return fig
 
+def make_grid_map(cells: pd.DataFrame) -> px.density_mapbox:
+    """
+    Builds a Plotly density_mapbox figure of grid cell counts (MapStore.grid).
+    """
+    fig = px.density_mapbox(
+        cells,
+        lat='lat',
+        lon='lon',
+        z='count',
+        radius=10,
+        zoom=MAP_ZOOM,
+        height=600
+    )
+    fig.update_layout(
+        mapbox_style='open-street-map',
+        margin={'l': 0, 'r': 0, 't': 0, 'b': 0}
+    )
+    return fig
+
 def create_map_div(
-    csv_path: str,
+    store,
     category: str = None,
-    year: int = None
+    year: int = None,
+    mode: str = 'auto'
 ) -> str:
     """
-    Returns the HTML <div> for embedding the map.
+    Returns the HTML <div> for embedding the map. store is a MapStore (sliced
+    in memory) or a store directory (read from disk, always points). mode
+    'points' draws every event, 'grid' the precomputed cell counts and 'auto'
+    points only when the filter matches at most MAP_POINT_LIMIT events.
     """
-    df = load_map_data(csv_path)
-    fig = make_scatter_map(df, category, year)
+    if not isinstance(store, MapStore):
+        fig = make_scatter_map(load_map_data(store, year), category, year)
+    elif mode == 'points' or (mode == 'auto' and store.count(category, year) <= MAP_POINT_LIMIT):
+        fig = make_scatter_map(store.query(category, year))
+    else:
+        fig = make_grid_map(store.grid(category, year, MapStore.cell_km(MAP_ZOOM)))
     return pyo.plot(fig, include_plotlyjs='cdn', output_type='div')
@@ -7,12 +7,25 @@ import tensorflow as tf
 from sklearn.preprocessing import LabelEncoder
 from tensorflow.keras import layers, models, regularizers
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
+from scripts.processed_store import read_events
+from scripts.db_loader import read_daily_counts
+from scripts.daily_counts import DailyCounts, training_windows
+from scripts.inference import export_weights
 
+# Mokymo parametrai (galima keisti aplinkos kintamaisiais)
+BATCH_SIZE = int(os.getenv('TRAIN_BATCH_SIZE', 256))
+SHUFFLE_BUFFER = int(os.getenv('TRAIN_SHUFFLE_BUFFER', 65_536))
+TRAIN_THREADS = int(os.getenv('TRAIN_THREADS', 0))
+# Didesniam paketui – didesnis žingsnis (anksčiau 1e-4 su batch_size=32)
+LEARNING_RATE = float(os.getenv('TRAIN_LEARNING_RATE', 3e-4))
 
-def load_and_aggregate(data_path: str) -> pd.DataFrame:
+
+def load_and_aggregate(store_dir: str, from_db: bool = False) -> pd.DataFrame:
     """
     Įkelia eismo įvykių duomenis, agreguoja pagal savivaldybę ir dieną,
     koduoja savivaldybes ir išsaugo LabelEncoder.
+    Jei from_db=True, dienos skaičiai imami iš duomenų bazės suvestinės
+    daily_municipality_counts (žr. sql/INIT_DB.py).
 
     Returns:
         DataFrame su ['savivaldybe','date','accident_count','mun_code']
@@ -21,14 +34,18 @@ def load_and_aggregate(data_path: str) -> pd.DataFrame:
     models_dir = os.path.normpath(os.path.join(script_dir, '..', 'models'))
     os.makedirs(models_dir, exist_ok=True)
 
-    events = pd.read_csv(data_path, parse_dates=['dataLaikas'])
-    events['date'] = events['dataLaikas'].dt.floor('d')
-
-    agg_df = (
-        events.groupby(['savivaldybe','date'])
-              .size()
-              .reset_index(name='accident_count')
-    )
+    if from_db:
+        agg_df = read_daily_counts()
+    else:
+        events = read_events(columns=['savivaldybe', 'dataLaikas'], store_dir=store_dir)
+        events['savivaldybe'] = events['savivaldybe'].astype(str)
+        events['date'] = events['dataLaikas'].dt.floor('d')
+
+        agg_df = (
+            events.groupby(['savivaldybe','date'])
+                  .size()
+                  .reset_index(name='accident_count')
+        )
 
     le = LabelEncoder()
     agg_df['mun_code'] = le.fit_transform(agg_df['savivaldybe'])
@@ -37,6 +54,27 @@ def load_and_aggregate(data_path: str) -> pd.DataFrame:
     return agg_df
 
 
+def daily_calendar(agg_df: pd.DataFrame) -> DailyCounts:
+    """
+    Tankus dienų kalendorius (savivaldybė x diena, dienos be įvykių = 0),
+    kurio eilutės numeris sutampa su mun_code.
+    """
+    order = agg_df.drop_duplicates('mun_code').sort_values('mun_code')['savivaldybe']
+    return DailyCounts.from_aggregated(agg_df, municipalities=order)
+
+
+def make_training_windows(agg_df: pd.DataFrame, seq_len: int = 30):
+    """
+    Vienu praėjimu paruošia visus mokymosi langus iš tankaus dienų kalendoriaus
+    (be Python ciklų). X_seq yra kopija (seq_len kartų didesnė už kalendorių);
+    mokymas langus pjausto skrydžio metu (make_dataset).
+
+    Returns:
+        X_seq (N, seq_len, 1), y_seq (N,), mun_seq (N,), dates (N,) – prognozuojamos dienos data
+    """
+    return training_windows(daily_calendar(agg_df), seq_len)
+
+
 def prepare_sequence(df: pd.DataFrame, seq_len: int = 30) -> np.ndarray:
     """
     Paruošia seką LSTM modeliui:
@@ -45,17 +83,7 @@ def prepare_sequence(df: pd.DataFrame, seq_len: int = 30) -> np.ndarray:
     """
     # Mokymosi atvejis: naudoti grupuotą DataFrame
     if 'accident_count' in df.columns and 'mun_code' in df.columns:
-        X, y, mun_ids = [], [], []
-        for mun_id, grp in df.groupby('mun_code'):
-            grp = grp.sort_values('date')
-            counts = grp['accident_count'].values
-            for i in range(len(counts) - seq_len):
-                X.append(counts[i:i+seq_len])
-                y.append(counts[i+seq_len])
-                mun_ids.append(mun_id)
-        X_seq = np.array(X).reshape(-1, seq_len, 1)
-        y_seq = np.array(y)
-        mun_seq = np.array(mun_ids)
+        X_seq, y_seq, mun_seq, _ = make_training_windows(df, seq_len)
         return X_seq, y_seq, mun_seq
 
     # Inference atvejis: raw arba filtruoti įrašai be accident_count
@@ -75,9 +103,71 @@ def prepare_sequence(df: pd.DataFrame, seq_len: int = 30) -> np.ndarray:
     raise ValueError("Negalima paruošti sekos: netinkamas DataFrame formatas.")
 
 
+def split_days(daily: DailyCounts, val_years: int = 1, test_years: int = 2) -> dict:
+    """
+    Chronologinis skaidymas pagal prognozuojamos dienos stulpelį kalendoriuje:
+    paskutiniai test_years metai – testavimui, val_years prieš juos – validacijai,
+    visa kita – treniravimui. Grąžina {'train'|'val'|'test': (nuo, iki)}, iki neįskaitant.
+    """
+    test_start = daily.day(daily.end - pd.DateOffset(years=test_years))
+    val_start = daily.day(daily.end - pd.DateOffset(years=test_years + val_years))
+    return {
+        'train': (0, max(val_start, 0)),
+        'val': (max(val_start, 0), max(test_start, 0)),
+        'test': (max(test_start, 0), daily.n_days),
+    }
+
+
+def make_dataset(daily: DailyCounts, seq_len: int, day_range: tuple,
+                 batch_size: int = 256, shuffle_buffer: int = 0, seed: int = None) -> tf.data.Dataset:
+    """
+    tf.data srautas, kuris langus pjausto skrydžio metu iš dienų kalendoriaus
+    (savivaldybė x diena): atmintyje laikoma tik pati skaičių matrica, o ne
+    visi (N, seq_len, 1) langai. Imami tik langai, kurių prognozuojama diena
+    patenka į day_range = (nuo, iki).
+
+    Maišomi tik pavyzdžių indeksai (diena x savivaldybė tvarka), todėl
+    shuffle_buffer atmintis nepriklauso nuo seq_len. Grąžina ((X, mun), y) paketus.
+    """
+    counts = tf.constant(daily.counts, dtype=tf.float32)
+    n_mun = daily.counts.shape[0]
+    first, last = max(day_range[0], seq_len), day_range[1]
+    n_samples = max(last - first, 0) * n_mun
+    offsets = tf.range(-seq_len, 0, dtype=tf.int64)
+
+    def to_windows(idx):
+        day = first + idx // n_mun
+        mun = idx % n_mun
+        cols = day[:, None] + offsets
+        rows = tf.broadcast_to(mun[:, None], tf.shape(cols))
+        X = tf.gather_nd(counts, tf.stack([rows, cols], axis=-1))[..., None]
+        y = tf.gather_nd(counts, tf.stack([mun, day], axis=-1))
+        return (X, tf.cast(mun, tf.int32)), y
+
+    ds = tf.data.Dataset.range(n_samples)
+    if shuffle_buffer:
+        ds = ds.shuffle(min(shuffle_buffer, max(n_samples, 1)), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size).map(to_windows, num_parallel_calls=tf.data.AUTOTUNE)
+
+    options = tf.data.Options()
+    options.deterministic = not shuffle_buffer
+    return ds.with_options(options).prefetch(tf.data.AUTOTUNE)
+
+
+def configure_threads(num_threads: int = 0):
+    """
+    CPU gijų skaičius TensorFlow operacijoms (0 – TensorFlow numatytasis,
+    t.y. visi branduoliai). Kviečiama prieš kuriant modelį.
+    """
+    if num_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(num_threads)
+
+
 def build_lstm_model(num_muns: int, seq_len: int = 30,
                      emb_dim: int = 8, lstm_units: int = 64,
-                     l2_reg: float = 1e-6, dropout_rate: float = 0.2) -> tf.keras.Model:
+                     l2_reg: float = 1e-6, dropout_rate: float = 0.2,
+                     learning_rate: float = 1e-4) -> tf.keras.Model:
     """
     Sukuria ir kompiliuoja LSTM su dviem įėjimais: seka ir mun_code.
     """
@@ -91,37 +181,33 @@ def build_lstm_model(num_muns: int, seq_len: int = 30,
     x = layers.Dropout(dropout_rate)(x)
     out = layers.Dense(1)(x)
     model = models.Model([seq_input, mun_input], out)
-    model.compile(optimizer=tf.keras.optimizers.Adam(1e-4),
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate),
                   loss='mse', metrics=[tf.keras.metrics.RootMeanSquaredError()])
     return model
 
 
 def main():
     script_dir = os.path.abspath(os.path.dirname(__file__))
-    data_path = os.path.normpath(os.path.join(script_dir, '..','data','processed','cleaned_events.csv'))
+    store_dir = os.path.normpath(os.path.join(script_dir, '..','data','processed','store'))
     models_dir = os.path.normpath(os.path.join(script_dir, '..','models'))
     os.makedirs(models_dir, exist_ok=True)
 
     # 1. Load & aggregate
-    agg = load_and_aggregate(data_path)
+    agg = load_and_aggregate(store_dir)
 
-    # 2. Prepare training sequences
+    # 2. Dense daily calendar (windows are cut on the fly by tf.data)
     SEQ_LEN = 30
-    X_seq, y_seq, mun_seq = prepare_sequence(agg, seq_len=SEQ_LEN)
-
-    # 3. Train-test split by date
-    cutoff = agg['date'].max() - pd.DateOffset(years=2)
-    dates = np.concatenate([
-        grp['date'].values[SEQ_LEN:]
-        for _, grp in agg.groupby('mun_code')
-    ])
-    mask = dates < np.datetime64(cutoff)
-    X_train, X_test = X_seq[mask], X_seq[~mask]
-    y_train, y_test = y_seq[mask], y_seq[~mask]
-    mun_train, mun_test = mun_seq[mask], mun_seq[~mask]
+    configure_threads(TRAIN_THREADS)
+    daily = daily_calendar(agg)
+
+    # 3. Train / validation / test split by date
+    splits = split_days(daily, val_years=1, test_years=2)
+    train_ds = make_dataset(daily, SEQ_LEN, splits['train'], BATCH_SIZE, shuffle_buffer=SHUFFLE_BUFFER, seed=42)
+    val_ds = make_dataset(daily, SEQ_LEN, splits['val'], BATCH_SIZE)
+    test_ds = make_dataset(daily, SEQ_LEN, splits['test'], BATCH_SIZE)
 
     # 4. Build model
-    model = build_lstm_model(agg['mun_code'].nunique(), seq_len=SEQ_LEN)
+    model = build_lstm_model(agg['mun_code'].nunique(), seq_len=SEQ_LEN, learning_rate=LEARNING_RATE)
 
     # 5. Callbacks
     callbacks = [
@@ -131,15 +217,17 @@ def main():
     ]
 
     # 6. Train
-    model.fit([X_train, mun_train], y_train, validation_split=0.2,
-              epochs=20, batch_size=32, callbacks=callbacks, verbose=2)
+    model.fit(train_ds, validation_data=val_ds,
+              epochs=20, callbacks=callbacks, verbose=2)
 
     # 7. Evaluate
-    loss, rmse = model.evaluate([X_test, mun_test], y_test, verbose=0)
+    loss, rmse = model.evaluate(test_ds, verbose=0)
     print(f"Test RMSE: {rmse:.3f}")
 
     # 8. Save final model
     model.save(os.path.join(models_dir,'lstm_accident_model_final.keras'), include_optimizer=False)
+    # NumPy weights for the TensorFlow-free web app (scripts/inference.py)
+    export_weights(model, os.path.join(models_dir,'lstm_accident_model_final.npz'))
 
 if __name__=='__main__':
     main()
\ No newline at end of file
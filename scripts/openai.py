@@ -1,10 +1,165 @@
 import os
+import json
+import time
+import hashlib
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
 from dotenv import load_dotenv
-import openai
 
 # Load environment variables for API key
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+
+LLM_MODEL = "gpt-4o-mini"
+# Responses are stored as <LLM_CACHE_DIR>/<hash[:2]>/<hash>.json; an empty value disables the cache
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', os.path.normpath(os.path.join(
+    os.path.dirname(__file__), '..', 'data', 'cache', 'llm')))
+# Categories listed one by one in a figure summary; longer axes are cut to the extremes
+MAX_CATEGORIES = 12
+
+_client = None
+
+
+class FakeClient:
+    """
+    Offline stand-in for the OpenAI client (OPENAI_FAKE=1 or set_client()):
+    answers every request with a fixed reply after an optional delay and
+    records the requests it got.
+    """
+
+    def __init__(self, reply: str = "[fake] Diagramos aprašymas.", delay: float = 0.0):
+        self.reply = reply
+        self.delay = delay
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.delay:
+            time.sleep(self.delay)
+        message = SimpleNamespace(content=self.reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def set_client(client):
+    """Replaces the LLM client (anything with chat.completions.create), e.g. a FakeClient."""
+    global _client
+    _client = client
+
+
+def get_client():
+    global _client
+    if _client is None:
+        if os.getenv('OPENAI_FAKE'):
+            _client = FakeClient()
+        else:
+            # imported on first use: the library takes about a second to import
+            import openai
+            openai.api_key = os.getenv("OPENAI_API_KEY")
+            _client = openai
+    return _client
+
+
+"""
+Chat completion through a persistent, content-addressed cache: the key is a
+hash of the model, messages and temperature, so a repeated prompt with the
+same payload is answered from disk without an LLM round trip. timeout (s)
+limits the request itself and is not part of the key.
+"""
+def cached_completion(messages: list, temperature: float, model: str = LLM_MODEL, timeout: float = None) -> str:
+    request = {'model': model, 'messages': messages, 'temperature': temperature}
+    key = hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    path = os.path.join(LLM_CACHE_DIR, key[:2], f'{key}.json') if LLM_CACHE_DIR else None
+
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)['content']
+
+    options = {'timeout': timeout} if timeout else {}
+    resp = get_client().chat.completions.create(**request, **options)
+    content = resp.choices[0].message.content.strip()
+
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'request': request, 'content': content}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    return content
+
+
+def _round(value):
+    # counts stay exact, other values keep 4 significant digits
+    value = float(value)
+    return int(value) if value.is_integer() else float(f'{value:.4g}')
+
+
+def _label(value):
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    return value if isinstance(value, (int, float)) else str(value)
+
+
+"""
+Compact description of one trace: point count, x extent (or categories),
+total, min/max with their x, mean and trend of y, instead of raw arrays.
+"""
+def summarize_trace(trace) -> dict:
+    summary = {'type': trace.type}
+    if getattr(trace, 'name', None):
+        summary['name'] = trace.name
+
+    if trace.type == 'pie':
+        x, y = trace.labels, trace.values
+    else:
+        x, y = getattr(trace, 'x', None), getattr(trace, 'y', None)
+    if y is None:
+        return summary
+    y = pd.to_numeric(pd.Series(np.asarray(y).ravel()), errors='coerce')
+    x = pd.Series(np.asarray(x).ravel()) if x is not None else pd.Series(range(len(y)))
+    values = pd.Series(y.to_numpy(), index=x.to_numpy()).dropna()
+    if values.index.has_duplicates:
+        values = values.groupby(level=0, sort=False).sum()
+    if values.empty:
+        return summary
+
+    summary['points'] = len(values)
+    numeric_x = pd.api.types.is_numeric_dtype(values.index) or pd.api.types.is_datetime64_any_dtype(values.index)
+    if numeric_x or len(values) > MAX_CATEGORIES:
+        summary['x_range'] = [_label(values.index.min()), _label(values.index.max())]
+    if not numeric_x:
+        shown = values if len(values) <= MAX_CATEGORIES else values.sort_values().iloc[[0, 1, 2, -3, -2, -1]]
+        summary['values'] = {str(k): _round(v) for k, v in shown.items()}
+
+    summary['total'] = _round(values.sum())
+    summary['min'] = {'x': _label(values.idxmin()), 'y': _round(values.min())}
+    summary['max'] = {'x': _label(values.idxmax()), 'y': _round(values.max())}
+    summary['mean'] = _round(values.mean())
+    if numeric_x and len(values) > 1:
+        ordered = values.sort_index()
+        slope = np.polyfit(np.arange(len(ordered)), ordered.to_numpy(dtype=float), 1)[0]
+        if abs(slope) < 1e-9 * max(abs(ordered).max(), 1):
+            slope = 0
+        summary['trend_per_step'] = _round(slope)
+        if ordered.iloc[0]:
+            summary['change_first_to_last_pct'] = _round((ordered.iloc[-1] / ordered.iloc[0] - 1) * 100)
+    return summary
+
+
+"""
+Compact, JSON-serializable summary of a Plotly figure (titles, axes and a
+summarize_trace() entry per trace) to send to the LLM instead of fig.to_dict().
+"""
+def summarize_figure(fig) -> dict:
+    layout = fig.layout
+    summary = {
+        'title': layout.title.text,
+        'x_axis': layout.xaxis.title.text,
+        'y_axis': layout.yaxis.title.text,
+        'traces': [summarize_trace(trace) for trace in fig.data],
+    }
+    return {k: v for k, v in summary.items() if v not in (None, '')}
+
 
 """
 Summarizes the entire project based on README.md.
@@ -33,39 +188,38 @@ def describe_project(readme_path: str = None) -> str:
     )
     user = f"Here is the project's README:\n\n```markdown\n{readme}\n```"
 
+    # 3. cached per README content, so it is only summarized again after an edit
     try:
-        resp = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        return cached_completion(
+            [
                 {"role": "system", "content": system},
                 {"role": "user",   "content": user}
             ],
             temperature=0.7
         )
-        return resp.choices[0].message.content.strip()
     except Exception as ex:
         return f"[ERROR] {ex}"
 
 """
 Given a Plotly figure object, returns a  description of a graph.
 """
-def describe_chart(fig, title: str = "") -> str:
+def describe_chart(fig, title: str = "", timeout: float = None) -> str:
 
-    fig_json = fig.to_dict()
+    fig_summary = json.dumps(summarize_figure(fig), ensure_ascii=False)
     system = (
         "Tu esi duomenų vizualizacijų asistentas. "
-        "Remdamasis Plotly diagramos JSON specifikacija, "
+        "Remdamasis Plotly diagramos santrauka (pavadinimai, ašys, kiekvienos "
+        "sekos sumos, kraštutinės reikšmės ir tendencijos), "
         "pateik glaustą ir vartotojui draugišką aprašymą, ką diagrama vaizduoja. "
         "Paaiškink, kokias tendencijas galima pastebėti diagramoje. "
         "Stenkis viską paaiškinti 2–3 sakiniais."
     )
-    user = f"Chart title: {title}\n\n```json\n{fig_json}\n```"
-    resp = openai.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+    user = f"Chart title: {title}\n\n```json\n{fig_summary}\n```"
+    return cached_completion(
+        [
             {"role": "system", "content": system},
             {"role": "user",   "content": user}
         ],
         temperature=0.3,
+        timeout=timeout,
     )
-    return resp.choices[0].message.content.strip()
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Forecasts keyed by (municipality, anchor date, model hash, data version).
+    An in-memory LRU of max_items entries sits in front of an optional SQLite
+    file (db_path), which survives restarts and is shared by workers. Keys
+    of another model or data version are never hit again; purge() drops
+    them from the file. A process forked after the cache was created (a
+    pre-fork server's worker) opens its own connection on first use.
+    """
+
+    def __init__(self, max_items: int = 4096, db_path: str = None):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_path = db_path
+        self._db = None
+        self._pid = None
+        if db_path:
+            self._connection().execute("""
+                CREATE TABLE IF NOT EXISTS predictions (
+                    municipality TEXT, anchor TEXT, model_hash TEXT, data_version TEXT,
+                    prediction REAL,
+                    PRIMARY KEY (municipality, anchor, model_hash, data_version)
+                )
+            """)
+            self._db.commit()
+
+    def _connection(self):
+        # SQLite connections must not be used across fork()
+        if self._db_path and self._pid != os.getpid():
+            self._db = sqlite3.connect(self._db_path, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._db
+
+    def get(self, key: tuple):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return value
+            db = self._connection()
+            if db is not None:
+                row = db.execute(
+                    "SELECT prediction FROM predictions WHERE municipality = ? AND anchor = ? "
+                    "AND model_hash = ? AND data_version = ?;", key
+                ).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put_many(self, items: dict):
+        with self._lock:
+            for key, value in items.items():
+                self._remember(key, value)
+            db = self._connection()
+            if db is not None:
+                db.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?);",
+                                     [(*key, value) for key, value in items.items()])
+                db.commit()
+
+    def put(self, key: tuple, value: float):
+        self.put_many({key: value})
+
+    def purge(self, model_hash: str, data_version: str):
+        """Drops entries of every other model / data version."""
+        with self._lock:
+            for key in [k for k in self._items if k[2:] != (model_hash, data_version)]:
+                del self._items[key]
+            db = self._connection()
+            if db is not None:
+                db.execute("DELETE FROM predictions WHERE model_hash <> ? OR data_version <> ?;",
+                                 (model_hash, data_version))
+                db.commit()
+
+    def _remember(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
@@ -0,0 +1,185 @@
+import os
+import hashlib
+import glob
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+"""
+Typed, columnar store of the cleaned data.
+
+Events and participants are kept as Parquet files partitioned by year
+(<store>/<table>/metai=YYYY/<part>.parquet). Every raw file writes its own
+fragments, so re-ingesting one file only replaces that file's fragments.
+Low-cardinality text columns are dictionary encoded (pandas categoricals) and
+numeric columns use the smallest type that fits.
+"""
+
+STORE_DIR = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'processed', 'store'
+))
+TABLES = ('events', 'participants')
+
+_CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+EVENTS_SCHEMA = pa.schema([
+    ('registrokodas', pa.string()),
+    ('dataLaikas', pa.timestamp('ns')),
+    ('savivaldybe', _CATEGORY),
+    ('ivykioVieta', pa.string()),
+    ('rusis', _CATEGORY),
+    ('schema1', _CATEGORY),
+    ('schema2', _CATEGORY),
+    ('dangosBukle', _CATEGORY),
+    ('parosMetas', _CATEGORY),
+    ('kelioApsvietimas', _CATEGORY),
+    ('meteoSalygos', _CATEGORY),
+    ('neblaivusKaltininkai', pa.int8()),
+    ('apsvaigeKaltininkai', pa.int8()),
+    ('dalyviuSkaicius', pa.int16()),
+    ('zuvusiuSkaicius', pa.int16()),
+    ('zuvVaiku', pa.int16()),
+    ('suzeistuSkaicius', pa.int16()),
+    ('suzeistaVaiku', pa.int16()),
+    ('ilguma', pa.float64()),
+    ('platuma', pa.float64()),
+    # WGS84, projected from ilguma/platuma at ingest
+    ('lat', pa.float64()),
+    ('lon', pa.float64()),
+    ('leistinasGreitis', pa.float32()),
+    ('menuo', pa.int8()),
+    ('diena', pa.int8()),
+    ('valanda', pa.int8()),
+])
+
+PARTICIPANTS_SCHEMA = pa.schema([
+    ('dalyvisId', pa.string()),
+    ('registrokodas', pa.string()),
+    ('kategorija', _CATEGORY),
+    ('lytis', _CATEGORY),
+    ('amzius', pa.float32()),
+    ('bukle', _CATEGORY),
+    ('busena', _CATEGORY),
+    ('girtumasPromilemis', pa.float32()),
+    ('kaltininkas', pa.bool_()),
+    ('dalyvioBusena', _CATEGORY),
+    ('vairavimoStazas', pa.float32()),
+    ('dalyvioKetPazeidimai', pa.string()),
+])
+
+SCHEMAS = {'events': EVENTS_SCHEMA, 'participants': PARTICIPANTS_SCHEMA}
+PARTITIONING = ds.partitioning(pa.schema([('metai', pa.int16())]), flavor='hive')
+
+
+"""
+Converts a cleaned DataFrame to an Arrow table with the store's fixed schema,
+so fragments written from different chunks and files always agree.
+"""
+def to_arrow(df: pd.DataFrame, table: str) -> pa.Table:
+    schema = SCHEMAS[table]
+    df = df.copy()
+    for field in schema:
+        col = df[field.name]
+        if pa.types.is_dictionary(field.type) or pa.types.is_string(field.type):
+            df[field.name] = col.astype(str)
+        elif pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            df[field.name] = pd.to_numeric(col, errors='coerce')
+            if pa.types.is_integer(field.type):
+                df[field.name] = df[field.name].fillna(0)
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+"""
+Writes one part (e.g. one chunk of one raw file) of a table, split by year.
+years is a Series aligned with df giving each row's metai.
+"""
+def write_part(df: pd.DataFrame, years: pd.Series, table: str, part: str, store_dir: str = STORE_DIR):
+    for year, idx in df.groupby(years.values).groups.items():
+        year_dir = os.path.join(store_dir, table, f'metai={int(year)}')
+        os.makedirs(year_dir, exist_ok=True)
+        pq.write_table(to_arrow(df.loc[idx], table), os.path.join(year_dir, f'{part}.parquet'))
+
+"""
+Writes cleaned events and participants of one part. Participants are
+partitioned by the year of their event.
+"""
+def write_frames(events_df: pd.DataFrame, participants_df: pd.DataFrame, part: str,
+                 store_dir: str = STORE_DIR):
+    write_part(events_df, events_df['metai'], 'events', part, store_dir)
+    year_of = events_df.drop_duplicates('registrokodas').set_index('registrokodas')['metai']
+    write_part(participants_df, participants_df['registrokodas'].map(year_of),
+               'participants', part, store_dir)
+
+"""
+Returns all fragment paths of a table written for the chunks of one source
+(parts named '<source>-<chunk number>'). Only that exact source matches, not
+other sources whose name starts with it (e.g. 'a' does not match 'a-fix-0').
+"""
+def part_files(table: str, source: str, store_dir: str = STORE_DIR):
+    pattern = re.compile(re.escape(source) + r'-\d+\.parquet')
+    candidates = glob.glob(os.path.join(store_dir, table, 'metai=*', f'{glob.escape(source)}-*.parquet'))
+    return sorted(p for p in candidates if pattern.fullmatch(os.path.basename(p)))
+
+"""
+Deletes all fragments written for the chunks of one source.
+"""
+def remove_parts(source: str, store_dir: str = STORE_DIR):
+    for table in TABLES:
+        for path in part_files(table, source, store_dir):
+            os.remove(path)
+
+def _dataset(table: str, store_dir: str, files=None) -> ds.Dataset:
+    table_dir = os.path.join(store_dir, table)
+    if files is not None:
+        return ds.dataset(files, schema=_full_schema(table), format='parquet',
+                          partitioning=PARTITIONING, partition_base_dir=table_dir)
+    return ds.dataset(table_dir, schema=_full_schema(table), format='parquet',
+                      partitioning=PARTITIONING)
+
+def _full_schema(table: str) -> pa.Schema:
+    return SCHEMAS[table].append(pa.field('metai', pa.int16()))
+
+"""
+Reads a table from the store. Only the requested columns and years are read
+from disk; metai is always available as a column.
+"""
+def read_table(table: str, columns=None, years=None, store_dir: str = STORE_DIR,
+               files=None) -> pd.DataFrame:
+    dataset = _dataset(table, store_dir, files)
+    flt = None
+    if years is not None:
+        flt = ds.field('metai').isin([int(y) for y in years])
+    return dataset.to_table(columns=columns, filter=flt).to_pandas()
+
+def read_events(columns=None, years=None, store_dir: str = STORE_DIR) -> pd.DataFrame:
+    return read_table('events', columns, years, store_dir)
+
+def read_participants(columns=None, years=None, store_dir: str = STORE_DIR) -> pd.DataFrame:
+    return read_table('participants', columns, years, store_dir)
+
+"""
+Reads everything written for the chunks of one source.
+"""
+def read_parts(table: str, source: str, store_dir: str = STORE_DIR) -> pd.DataFrame:
+    return read_table(table, store_dir=store_dir, files=part_files(table, source, store_dir))
+
+"""
+Lists the years present in the store without reading any data.
+"""
+def available_years(store_dir: str = STORE_DIR):
+    pattern = os.path.join(store_dir, 'events', 'metai=*')
+    return sorted(int(os.path.basename(p).split('=')[1]) for p in glob.glob(pattern))
+
+"""
+Short hash of the store's part files (path, size, mtime), which changes
+whenever an ingest writes or removes a part. Used as the data version of
+cached figures.
+"""
+def store_version(store_dir: str = STORE_DIR) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(store_dir, '*', 'metai=*', '*.parquet'))):
+        stat = os.stat(path)
+        digest.update(f'{os.path.relpath(path, store_dir)}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode('utf-8'))
+    return digest.hexdigest()[:16]
@@ -0,0 +1,70 @@
+import logging
+import threading
+import time
+
+
+class Resources:
+    """
+    Named, lazily loaded resources of the web app (model, data frames, ...).
+    get(name) runs the registered loader on first use, once even with
+    concurrent callers; warm_up() loads them on a background thread so the
+    first request that needs one does not pay for it. status() reports what
+    is loaded, for the readiness endpoint.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._values = {}
+        self._locks = {}
+        self._status = {}
+
+    def register(self, name: str, loader):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+        self._status[name] = {'state': 'pending'}
+
+    def get(self, name: str):
+        if name in self._values:
+            return self._values[name]
+        with self._locks[name]:
+            if name not in self._values:
+                self._status[name] = {'state': 'loading'}
+                start = time.perf_counter()
+                try:
+                    value = self._loaders[name]()
+                except Exception as e:
+                    self._status[name] = {'state': 'failed', 'error': str(e)}
+                    raise
+                self._values[name] = value
+                self._status[name] = {'state': 'loaded', 'seconds': round(time.perf_counter() - start, 3)}
+        return self._values[name]
+
+    def reset(self, *names: str):
+        """Forgets loaded values, so the next get() loads them again."""
+        for name in names:
+            with self._locks[name]:
+                self._values.pop(name, None)
+                self._status[name] = {'state': 'pending'}
+
+    def loaded(self, name: str) -> bool:
+        return name in self._values
+
+    @property
+    def ready(self) -> bool:
+        return all(name in self._values for name in self._loaders)
+
+    def status(self) -> dict:
+        return {name: dict(status) for name, status in self._status.items()}
+
+    def load_all(self, names=None):
+        """Loads the given (default: all) resources in order; failures are logged, not raised."""
+        for name in names or list(self._loaders):
+            try:
+                self.get(name)
+            except Exception:
+                logging.getLogger(__name__).exception(f"Loading resource {name!r} failed")
+
+    def warm_up(self, names=None) -> threading.Thread:
+        thread = threading.Thread(target=self.load_all, args=(names,), name='warm-up', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; concurrent builds are then possible but harmless
+    fcntl = None
+
+"""
+Read-only arrays shared by every web worker process.
+
+A published set is a directory <shared>/<name>/ with one .npy file per array
+and meta.json. open_arrays() maps the files (np.load(mmap_mode='r')), so all
+workers use the same page-cache pages instead of private copies, and opening
+them parses nothing. Sets are replaced by renaming a complete directory into
+place; workers that still map the old files keep reading them until they
+reload.
+"""
+
+SHARED_DIR = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'processed', 'shared'
+))
+
+
+"""
+Writes arrays (name -> ndarray, no object dtypes) and a JSON-serializable
+meta dict as the set `name`. version identifies the data they were derived
+from (e.g. store_version()); open_arrays() ignores sets of another version.
+"""
+def publish(name: str, arrays: dict, meta: dict = None, version: str = None, shared_dir: str = SHARED_DIR):
+    os.makedirs(shared_dir, exist_ok=True)
+    target = os.path.join(shared_dir, name)
+    tmp = f'{target}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for key, array in arrays.items():
+        array = np.asarray(array)
+        if array.dtype == object:
+            raise TypeError(f'{name}/{key}: object arrays cannot be memory-mapped')
+        np.save(os.path.join(tmp, f'{key}.npy'), array, allow_pickle=False)
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'arrays': sorted(arrays), 'meta': meta or {}}, f, ensure_ascii=False)
+
+    old = f'{target}.{os.getpid()}.old'
+    try:
+        os.replace(target, old)
+    except FileNotFoundError:
+        pass
+    try:
+        os.replace(tmp, target)
+    except OSError:
+        # another process published the set in between; keep theirs
+        shutil.rmtree(tmp, ignore_errors=True)
+    shutil.rmtree(old, ignore_errors=True)
+
+"""
+Maps the set `name` read-only. Returns (arrays, meta), or None if it was not
+published or was published for another version.
+"""
+def open_arrays(name: str, version: str = None, shared_dir: str = SHARED_DIR):
+    directory = os.path.join(shared_dir, name)
+    try:
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            info = json.load(f)
+        if version is not None and info['version'] != version:
+            return None
+        arrays = {key: np.load(os.path.join(directory, f'{key}.npy'), mmap_mode='r', allow_pickle=False)
+                  for key in info['arrays']}
+    except FileNotFoundError:
+        # missing, or replaced by a concurrent publish()
+        return None
+    return arrays, info['meta']
+
+@contextmanager
+def _build_lock(name: str, shared_dir: str):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(shared_dir, f'{name}.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+"""
+The object of class cls (with to_arrays() and from_arrays(arrays, meta))
+stored as the set `name` at this version, memory-mapped. If the set is
+missing or stale, build() makes it and it is published first; one worker
+builds while the others wait for it. If the shared directory is not
+writable, the built object is returned as a private copy.
+"""
+def load_shared(name: str, cls, build, version: str = None, shared_dir: str = SHARED_DIR):
+    opened = open_arrays(name, version, shared_dir)
+    if opened is not None:
+        return cls.from_arrays(*opened)
+    value = None
+    try:
+        os.makedirs(shared_dir, exist_ok=True)
+        with _build_lock(name, shared_dir):
+            opened = open_arrays(name, version, shared_dir)
+            if opened is None:
+                value = build()
+                publish(name, *value.to_arrays(), version=version, shared_dir=shared_dir)
+                opened = open_arrays(name, version, shared_dir)
+    except OSError:
+        opened = None
+    if opened is None:
+        return value if value is not None else build()
+    return cls.from_arrays(*opened)
+
+"""
+Concatenates a dict of 1-D arrays into one array plus offsets, so a dict of
+many small arrays is stored as two files; unpack() returns views again.
+"""
+def pack(parts: dict, dtype=None):
+    keys = list(parts)
+    lengths = [len(parts[k]) for k in keys]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    values = [np.asarray(parts[k]) for k in keys]
+    data = np.concatenate(values) if values else np.empty(0, dtype=dtype or np.int64)
+    return keys, data.astype(dtype or data.dtype, copy=False), offsets
+
+def unpack(keys: list, data: np.ndarray, offsets: np.ndarray) -> dict:
+    return {key: data[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
@@ -4,15 +4,128 @@ import plotly.graph_objects as go
 import plotly.express as px
 import calendar
 
+AGE_BINS = [0, 18, 30, 45, 60, 75, np.inf]
+AGE_LABELS = ['0–17', '18–29', '30–44', '45–59', '60–74', '75+']
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+"""
+One row per fatality (participant with bukle 'Žuvo') with the attributes of
+its event joined on, the weekday (0 = Monday) parsed once and the age group.
+"""
+def fatality_facts(events_df: pd.DataFrame, participants_df: pd.DataFrame) -> pd.DataFrame:
+    deaths = participants_df.loc[participants_df['bukle'] == 'Žuvo', ['registrokodas', 'lytis', 'amzius']]
+    facts = deaths.merge(
+        events_df[['registrokodas', 'metai', 'rusis', 'dataLaikas']],
+        on='registrokodas'
+    )
+    age = pd.to_numeric(facts['amzius'], errors='coerce')
+    return pd.DataFrame({
+        'metai': facts['metai'],
+        'weekday': pd.to_datetime(facts['dataLaikas'], errors='coerce').dt.weekday,
+        'lytis': facts['lytis'].astype(str),
+        'age_known': age.notna(),
+        'age_group': pd.cut(age, bins=AGE_BINS, labels=AGE_LABELS, right=False),
+        'rusis': facts['rusis'].astype(str),
+    })
+
+
+class ChartAggregates:
+    """
+    Counts behind every chart of this module, computed in one groupby per
+    table: events by (metai, month) and fatalities by (metai, weekday, lytis,
+    age, rusis). Each chart then sums the margins it needs, so the charts
+    cost nothing in proportion to the data and the frames need not be kept.
+    The chart functions accept a ChartAggregates in place of events_df.
+    """
+
+    def __init__(self, events: pd.Series, deaths: pd.Series = None):
+        self.events = events
+        self.deaths = deaths
+
+    @classmethod
+    def from_frames(cls, events_df: pd.DataFrame, participants_df: pd.DataFrame = None) -> 'ChartAggregates':
+        month = events_df['dataLaikas'].dt.month.rename('month')
+        events = events_df.groupby(['metai', month], dropna=False).size()
+        deaths = None
+        if participants_df is not None:
+            facts = fatality_facts(events_df, participants_df)
+            deaths = facts.groupby(list(facts.columns), dropna=False, observed=True).size()
+        return cls(events, deaths)
+
+    def to_arrays(self):
+        """Index levels and counts as plain arrays plus meta, for shared_arrays.publish()."""
+        arrays, meta = {}, {}
+        for name, series in (('events', self.events), ('deaths', self.deaths)):
+            if series is None:
+                continue
+            meta[name] = list(series.index.names)
+            for level in series.index.names:
+                values = series.index.get_level_values(level)
+                numeric = pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values)
+                arrays[f'{name}_{level}'] = values.to_numpy() if numeric else values.astype(str).to_numpy().astype(str)
+            arrays[f'{name}_count'] = series.to_numpy()
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta: dict) -> 'ChartAggregates':
+        series = {}
+        for name, levels in meta.items():
+            index = pd.MultiIndex.from_arrays([
+                # missing age groups were written as 'nan', which is not a category
+                pd.Categorical(arrays[f'{name}_{level}'], categories=AGE_LABELS) if level == 'age_group'
+                else np.asarray(arrays[f'{name}_{level}'])
+                for level in levels
+            ], names=levels)
+            series[name] = pd.Series(np.asarray(arrays[f'{name}_count']), index=index)
+        return cls(series['events'], series.get('deaths'))
+
+    def _deaths(self, first: int, last: int) -> pd.Series:
+        if self.deaths is None:
+            raise ValueError('fatality charts need participants_df')
+        years = self.deaths.index.get_level_values('metai')
+        return self.deaths[(years >= first) & (years <= last)]
+
+    def events_by_year(self, first: int, last: int) -> pd.Series:
+        yearly = self.events.groupby(level='metai').sum()
+        return yearly[(yearly.index >= first) & (yearly.index <= last)]
+
+    def events_by_month(self, first: int, last: int) -> pd.DataFrame:
+        events = self.events.reset_index(name='count').dropna(subset=['month'])
+        events = events[events['metai'].between(first, last)]
+        events['month'] = events['month'].astype('int32')
+        return events.groupby(['month', 'metai'])['count'].sum().reset_index()
+
+    def deaths_by_year(self, first: int, last: int) -> pd.Series:
+        return self._deaths(first, last).groupby(level='metai').sum()
+
+    def deaths_by(self, level: str, first: int, last: int, age_known: bool = False) -> pd.Series:
+        """Fatalities per value of one level (largest first), optionally only those of known age."""
+        deaths = self._deaths(first, last)
+        if age_known:
+            deaths = deaths[deaths.index.get_level_values('age_known')]
+        return deaths.groupby(level=level).sum().sort_values(ascending=False)
+
+    def deaths_by_weekday(self, first: int, last: int) -> pd.Series:
+        weekdays = self._deaths(first, last).groupby(level='weekday').sum()
+        return weekdays.reindex(range(7)).set_axis(WEEKDAYS)
+
+    def deaths_by_age_group(self, first: int, last: int) -> pd.Series:
+        ages = self._deaths(first, last).groupby(level='age_group', observed=True).sum()
+        return ages.reindex(AGE_LABELS, fill_value=0)
+
+
+def _aggregates(events_df, participants_df=None) -> ChartAggregates:
+    if isinstance(events_df, ChartAggregates):
+        return events_df
+    return ChartAggregates.from_frames(events_df, participants_df)
+
 """
 Forecast the number of traffic accidents per year (2013–2026) using a 3-year simple moving average.
-events_df: DataFrame containing at least a 'metai' column with year of each event.
+events_df: DataFrame containing at least a 'metai' column with year of each event, or a ChartAggregates.
 """
-def forecast_accidents_sma(events_df: pd.DataFrame) -> go.Figure:
+def forecast_accidents_sma(events_df) -> go.Figure:
 
-    df = events_df.copy()
-    df = df[df['metai'].between(2013, 2023)]
-    summary = df.groupby('metai').size().reset_index(name='accident_count')
+    summary = _aggregates(events_df).events_by_year(2013, 2023).reset_index(name='accident_count')
     summary['SMA'] = summary['accident_count'].rolling(window=3, min_periods=1).mean()
 
     last_sma = summary['SMA'].iloc[-1]
@@ -43,31 +156,20 @@ def forecast_accidents_sma(events_df: pd.DataFrame) -> go.Figure:
 Analyze fatalities by gender, age group, and accident type (2017–2023).
 Returns a combined figure with three subplots.
 """
-def analyze_deaths_by_gender_age_type(events_df: pd.DataFrame, participants_df: pd.DataFrame) -> go.Figure:
+def analyze_deaths_by_gender_age_type(events_df, participants_df: pd.DataFrame = None) -> go.Figure:
 
-    # Prepare merged data
-    deaths = participants_df[participants_df['bukle'] == 'Žuvo']
-    merged = deaths.merge(
-        events_df[['registrokodas', 'metai', 'rusis']],
-        on='registrokodas', how='left'
-    )
-    period = merged[merged['metai'].between(2017, 2023)]
+    aggregates = _aggregates(events_df, participants_df)
 
     # Gender breakdown
-    gender_counts = period['lytis'].value_counts().reset_index()
+    gender_counts = aggregates.deaths_by('lytis', 2017, 2023).reset_index()
     gender_counts.columns = ['Gender', 'Count']
 
     # Age groups
-    period = period[period['amzius'].notna() & (period['amzius'] != 'Unknown')]
-    period['amzius'] = period['amzius'].astype(float)
-    bins = [0, 18, 30, 45, 60, 75, np.inf]
-    labels = ['0–17', '18–29', '30–44', '45–59', '60–74', '75+']
-    period['age_group'] = pd.cut(period['amzius'], bins=bins, labels=labels, right=False)
-    age_counts = period['age_group'].value_counts().sort_index().reset_index()
+    age_counts = aggregates.deaths_by_age_group(2017, 2023).reset_index()
     age_counts.columns = ['Age group', 'Count']
 
-    # Accident type breakdown
-    type_counts = period['rusis'].value_counts().reset_index()
+    # Accident type breakdown (fatalities of known age)
+    type_counts = aggregates.deaths_by('rusis', 2017, 2023, age_known=True).reset_index()
     type_counts.columns = ['Accident type', 'Count']
 
     # Create subplots
@@ -99,18 +201,9 @@ def analyze_deaths_by_gender_age_type(events_df: pd.DataFrame, participants_df:
 """
 Analyze on which weekdays most fatal accidents occurred (2017–2023).
 """
-def analyze_deaths_by_weekday(events_df: pd.DataFrame, participants_df: pd.DataFrame) -> go.Figure:
+def analyze_deaths_by_weekday(events_df, participants_df: pd.DataFrame = None) -> go.Figure:
 
-    deaths = participants_df[participants_df['bukle'] == 'Žuvo']
-    merged = deaths.merge(
-        events_df[['registrokodas', 'dataLaikas', 'metai']],
-        on='registrokodas', how='left'
-    )
-    df = merged[merged['metai'].between(2017, 2023)].copy()
-    df['dataLaikas'] = pd.to_datetime(df['dataLaikas'], errors='coerce')
-    df['weekday'] = df['dataLaikas'].dt.day_name()
-    order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    wd_counts = df['weekday'].value_counts().reindex(order).reset_index()
+    wd_counts = _aggregates(events_df, participants_df).deaths_by_weekday(2017, 2023).reset_index()
     wd_counts.columns = ['Weekday', 'Count']
 
     fig = px.bar(
@@ -123,12 +216,10 @@ def analyze_deaths_by_weekday(events_df: pd.DataFrame, participants_df: pd.DataF
 """
 Forecast fatalities per year using a 3-year SMA (2013–2026).
 """
-def plotly_death_forecast(events_df: pd.DataFrame, participants_df: pd.DataFrame) -> go.Figure:
+def plotly_death_forecast(events_df, participants_df: pd.DataFrame = None) -> go.Figure:
 
-    deaths = participants_df[participants_df['bukle'] == 'Žuvo']
-    merged = deaths.merge(events_df[['registrokodas', 'metai']], on='registrokodas')
-    yearly = merged[merged['metai'].between(2013, 2023)]
-    df_counts = yearly.groupby('metai').size().reset_index(name='Death count')
+    yearly = _aggregates(events_df, participants_df).deaths_by_year(2013, 2023)
+    df_counts = yearly.reset_index(name='Death count')
     df_counts['SMA'] = df_counts['Death count'].rolling(window=3, min_periods=1).mean()
 
     last_sma = df_counts['SMA'].iloc[-1]
@@ -149,22 +240,10 @@ def plotly_death_forecast(events_df: pd.DataFrame, participants_df: pd.DataFrame
     return fig
 
 
-def accidents_by_month(events_df: pd.DataFrame) -> go.Figure:
+def accidents_by_month(events_df) -> go.Figure:
 
-    # Filtering
-    df = events_df.copy()
-    df = df[df['metai'].between(2017, 2023)]
-
-    # Getting month
-    df['month'] = df['dataLaikas'].dt.month
-
-    # Group ny month and years
-    monthly = (
-        df
-        .groupby(['month', 'metai'])
-        .size()
-        .reset_index(name='count')
-    )
+    # Events per month and year
+    monthly = _aggregates(events_df).events_by_month(2017, 2023)
 
     # Creating bar char
     month_order = list(range(1, 13))
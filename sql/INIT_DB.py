@@ -1,4 +1,5 @@
 import os
+import datetime
 from dotenv import load_dotenv
 import psycopg2
 from psycopg2 import sql
@@ -15,8 +16,8 @@ PG_PORT = os.getenv('PG_PORT', '5432')
 DB_NAME = os.getenv('DB_NAME')
 TABLE_SQL = """
     CREATE TABLE IF NOT EXISTS events (
-        registrokodas TEXT PRIMARY KEY,
-        dataLaikas TIMESTAMP,
+        registrokodas TEXT NOT NULL,
+        dataLaikas TIMESTAMP NOT NULL,
         savivaldybe TEXT,
         ivykioVieta TEXT,
         rusis TEXT,
@@ -39,12 +40,14 @@ TABLE_SQL = """
         metai INTEGER,
         menuo INTEGER,
         diena INTEGER,
-        valanda INTEGER
-    );
+        valanda INTEGER,
+        row_hash BIGINT,
+        PRIMARY KEY (registrokodas, dataLaikas)
+    ) PARTITION BY RANGE (dataLaikas);
     CREATE TABLE IF NOT EXISTS participants (
         id SERIAL PRIMARY KEY,
         dalyvisId TEXT,
-        registrokodas TEXT REFERENCES events(registrokodas) ON DELETE CASCADE,
+        registrokodas TEXT,
         kategorija TEXT,
         lytis TEXT,
         amzius INTEGER,
@@ -56,8 +59,76 @@ TABLE_SQL = """
         vairavimoStazas NUMERIC,
         dalyvioKetPazeidimai TEXT
     );
-       
+
+    -- Esamoms duomenu bazems: prideda row_hash, pasalina pasikartojancius
+    -- dalyvius ir sukuria naturalu dalyvio rakta
+    ALTER TABLE events ADD COLUMN IF NOT EXISTS row_hash BIGINT;
+    -- 'Unknown' nera dalyvio ID: tokie dalyviai saugomi su NULL ir nesujungiami
+    UPDATE participants SET dalyvisId = NULL WHERE dalyvisId = 'Unknown';
+    DELETE FROM participants a USING participants b
+        WHERE a.id > b.id
+          AND a.registrokodas = b.registrokodas
+          AND a.dalyvisId = b.dalyvisId;
+    CREATE UNIQUE INDEX IF NOT EXISTS participants_registrokodas_dalyvisid_key
+        ON participants (registrokodas, dalyvisId);
+"""
+
+# events skaidoma metais pagal dataLaikas; ivykiai uz siu metu ribu patenka i events_default
+FIRST_PARTITION_YEAR = 2013
+LAST_PARTITION_YEAR = datetime.date.today().year + 1
+
+def partitions_sql(first=FIRST_PARTITION_YEAR, last=LAST_PARTITION_YEAR):
+    statements = [
+        f"CREATE TABLE IF NOT EXISTS events_{year} PARTITION OF events "
+        f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01');"
+        for year in range(first, last + 1)
+    ]
+    statements.append("CREATE TABLE IF NOT EXISTS events_default PARTITION OF events DEFAULT;")
+    return "\n".join(statements)
+
+# Antriniai indeksai (sukuriami kiekvienai particijai). participants.registrokodas
+# paieskas aptarnauja unikalus (registrokodas, dalyvisId) indeksas.
+INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS events_savivaldybe_idx ON events (savivaldybe);
+    CREATE INDEX IF NOT EXISTS events_rusis_idx ON events (rusis);
+    CREATE INDEX IF NOT EXISTS events_datalaikas_idx ON events (dataLaikas);
+"""
+
+# Suvestines lenteles, atnaujinamos po kiekvieno ikelimo (scripts/db_loader.py: refresh_aggregates)
+AGGREGATES_SQL = """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS daily_municipality_counts AS
+        SELECT dataLaikas::date AS data,
+               savivaldybe,
+               count(*) AS ivykiuSkaicius,
+               sum(zuvusiuSkaicius) AS zuvusiuSkaicius,
+               sum(suzeistuSkaicius) AS suzeistuSkaicius
+        FROM events
+        GROUP BY 1, 2;
+    CREATE UNIQUE INDEX IF NOT EXISTS daily_municipality_counts_key
+        ON daily_municipality_counts (data, savivaldybe);
+
+    CREATE MATERIALIZED VIEW IF NOT EXISTS yearly_fatality_counts AS
+        SELECT e.metai, count(*) AS zuvusiuSkaicius
+        FROM participants p
+        JOIN events e ON e.registrokodas = p.registrokodas
+        WHERE p.bukle = 'Žuvo'
+        GROUP BY e.metai;
+    CREATE UNIQUE INDEX IF NOT EXISTS yearly_fatality_counts_key
+        ON yearly_fatality_counts (metai);
+"""
+
+# Senos (neskaidytos) events lenteles perkelimas i skaidyta
+LEGACY_RENAME_SQL = """
+    ALTER TABLE participants DROP CONSTRAINT IF EXISTS participants_registrokodas_fkey;
+    ALTER TABLE events ADD COLUMN IF NOT EXISTS row_hash BIGINT;
+    ALTER TABLE events RENAME TO events_legacy;
+    ALTER TABLE events_legacy RENAME CONSTRAINT events_pkey TO events_legacy_pkey;
 """
+LEGACY_COPY_SQL = """
+    INSERT INTO events SELECT * FROM events_legacy WHERE dataLaikas IS NOT NULL;
+    DROP TABLE events_legacy;
+"""
+
 # prijungia prie DEFAULT duomenu bazes
 
 conn = psycopg2.connect(  #nusakome kur jungtis
@@ -97,7 +168,20 @@ def create_table():
             port=PG_PORT
         ) as conn:
             with conn.cursor() as cursor:
+                # ar events dar sena, neskaidyta lentele ('r')?
+                cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('events');")
+                row = cursor.fetchone()
+                legacy = row is not None and row[0] == 'r'
+                if legacy:
+                    cursor.execute(LEGACY_RENAME_SQL)
+
                 cursor.execute(TABLE_SQL)
+                cursor.execute(partitions_sql())
+                if legacy:
+                    cursor.execute(LEGACY_COPY_SQL)
+                    print("Migrated events to the partitioned table")
+                cursor.execute(INDEX_SQL)
+                cursor.execute(AGGREGATES_SQL)
                 conn.commit()
                 print("Table created")
     except psycopg2.Error as e: